@@ -0,0 +1,264 @@
+"""コード進行の統計(n-gram集計・トレンド)
+
+承認済みの進行に含まれるコードのn-gram(2〜4連続のコード)を集計する。
+JSONBのPattern.chordsを毎回走査しないよう、集計値は専用テーブルに保持し、
+process_pendingでの承認時に差分だけを加算・減算する。
+
+- chord_ngram_stats: n-gramごとの累計(そのn-gramを含む承認済み進行の数)
+- chord_ngram_daily: 承認日ごとの増減(直近N日の合計がトレンド)
+
+承認日は承認時のupdated_at(UTC)の日付とする。却下された投稿は
+承認待ちのまま集計対象になっていないため、却下時は集計を変更しない。
+
+集計値は再構築コマンドで全件から作り直し、差分を確認できる:
+    python analytics.py rebuild [--check]
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import select, delete, func, and_, text, bindparam, Date, SmallInteger, BigInteger, Text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from chord_utils import normalize_chord
+from models import Progression, Pattern, ChordNgramStat, ChordNgramDaily
+
+# 集計するn-gramの長さ
+NGRAM_SIZES = (2, 3, 4)
+# 再構築時に1度に読み込む行数
+REBUILD_BATCH_SIZE = 1000
+
+Ngram = Tuple[int, str]
+
+UPSERT_STATS_SQL = text("""
+    INSERT INTO chord_ngram_stats (n, ngram, count)
+    SELECT * FROM unnest(:ns, :ngrams, :deltas)
+    ON CONFLICT (n, ngram) DO UPDATE
+    SET count = chord_ngram_stats.count + EXCLUDED.count
+""").bindparams(
+    bindparam("ns", type_=ARRAY(SmallInteger)),
+    bindparam("ngrams", type_=ARRAY(Text)),
+    bindparam("deltas", type_=ARRAY(BigInteger)),
+)
+
+UPSERT_DAILY_SQL = text("""
+    INSERT INTO chord_ngram_daily (day, n, ngram, count)
+    SELECT * FROM unnest(:days, :ns, :ngrams, :deltas)
+    ON CONFLICT (day, n, ngram) DO UPDATE
+    SET count = chord_ngram_daily.count + EXCLUDED.count
+""").bindparams(
+    bindparam("days", type_=ARRAY(Date)),
+    bindparam("ns", type_=ARRAY(SmallInteger)),
+    bindparam("ngrams", type_=ARRAY(Text)),
+    bindparam("deltas", type_=ARRAY(BigInteger)),
+)
+
+
+def extract_ngrams(patterns: Iterable[List[Optional[str]]]) -> Set[Ngram]:
+    """パターンのコード配列からn-gramの集合を抽出
+
+    空き枠は除外し、同じコードの連続(2拍以上伸ばすコード)は1つにまとめる。
+    1つの進行内で重複するn-gramは1回として数える。
+
+    Args:
+        patterns: 各パターンの16枠分のコード配列
+
+    Returns:
+        set: (n, "IV|V|IIIm|VIm") 形式のn-gram集合
+    """
+    ngrams: Set[Ngram] = set()
+    for chords in patterns:
+        sequence: List[str] = []
+        for chord in chords or []:
+            if not chord:
+                continue
+            normalized = normalize_chord(chord)
+            if not sequence or sequence[-1] != normalized:
+                sequence.append(normalized)
+        for n in NGRAM_SIZES:
+            for i in range(len(sequence) - n + 1):
+                ngrams.add((n, "|".join(sequence[i:i + n])))
+    return ngrams
+
+
+async def _load_ngrams(db: AsyncSession, progression_id: UUID) -> Set[Ngram]:
+    stmt = select(Pattern.chords).where(Pattern.progression_id == progression_id)
+    result = await db.execute(stmt)
+    return extract_ngrams(result.scalars().all())
+
+
+async def apply_deltas(db: AsyncSession, deltas: Dict[Tuple[date, int, str], int]) -> None:
+    """(承認日, n, ngram) → 増減 を累計・日別の両テーブルへ加算"""
+    deltas = {key: value for key, value in deltas.items() if value}
+    if not deltas:
+        return
+    totals: Counter = Counter()
+    for (_, n, ngram), value in deltas.items():
+        totals[(n, ngram)] += value
+    await db.execute(UPSERT_STATS_SQL, {
+        "ns": [n for n, _ in totals],
+        "ngrams": [ngram for _, ngram in totals],
+        "deltas": list(totals.values()),
+    })
+    await db.execute(UPSERT_DAILY_SQL, {
+        "days": [day for day, _, _ in deltas],
+        "ns": [n for _, n, _ in deltas],
+        "ngrams": [ngram for _, _, ngram in deltas],
+        "deltas": list(deltas.values()),
+    })
+
+
+async def record_approval(
+    db: AsyncSession,
+    progression_id: UUID,
+    original: Optional[Progression] = None
+) -> None:
+    """承認による集計値の差分を反映(承認と同じトランザクションで実行)
+
+    編集リクエストの場合は、元の投稿の分をその承認日から差し引く。
+
+    Args:
+        db: データベースセッション(コミット前)
+        progression_id: 承認する投稿のID
+        original: 編集リクエストの場合、置き換えられる元の投稿
+    """
+    today = datetime.utcnow().date()
+    deltas: Counter = Counter()
+    for n, ngram in await _load_ngrams(db, progression_id):
+        deltas[(today, n, ngram)] += 1
+    if original is not None:
+        original_day = (original.updated_at or original.created_at).date()
+        for n, ngram in await _load_ngrams(db, original.id):
+            deltas[(original_day, n, ngram)] -= 1
+    await apply_deltas(db, deltas)
+
+
+async def top_ngrams(db: AsyncSession, n: int, limit: int) -> List[dict]:
+    """累計で最も多く使われているn-gram"""
+    stmt = select(ChordNgramStat.ngram, ChordNgramStat.count).where(
+        and_(ChordNgramStat.n == n, ChordNgramStat.count > 0)
+    ).order_by(ChordNgramStat.count.desc(), ChordNgramStat.ngram).limit(limit)
+    result = await db.execute(stmt)
+    return [{"ngram": ngram, "count": count} for ngram, count in result.all()]
+
+
+async def trending_ngrams(db: AsyncSession, n: int, days: int, limit: int) -> List[dict]:
+    """直近days日間に承認された進行で多く使われているn-gram"""
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    total = func.sum(ChordNgramDaily.count).label("total")
+    stmt = select(ChordNgramDaily.ngram, total).where(
+        and_(ChordNgramDaily.n == n, ChordNgramDaily.day >= since)
+    ).group_by(ChordNgramDaily.ngram).having(
+        func.sum(ChordNgramDaily.count) > 0
+    ).order_by(total.desc(), ChordNgramDaily.ngram).limit(limit)
+    result = await db.execute(stmt)
+    return [{"ngram": ngram, "count": int(count)} for ngram, count in result.all()]
+
+
+async def compute_from_scratch(db: AsyncSession) -> Tuple[Counter, Counter]:
+    """承認済みの全進行をストリーミングで読み込み、集計値を再計算
+
+    パターンは進行ID順に流し、進行が切り替わるたびにn-gramを確定させる。
+
+    Returns:
+        tuple: (累計Counter[(n, ngram)], 日別Counter[(day, n, ngram)])
+    """
+    totals: Counter = Counter()
+    daily: Counter = Counter()
+    stmt = select(
+        Progression.id, Progression.updated_at, Progression.created_at, Pattern.chords
+    ).join(
+        Pattern, Pattern.progression_id == Progression.id
+    ).where(
+        Progression.status == "approved"
+    ).order_by(Progression.id).execution_options(yield_per=REBUILD_BATCH_SIZE)
+
+    current_id = None
+    current_day = None
+    current_patterns: List[List[Optional[str]]] = []
+
+    def commit_current():
+        for n, ngram in extract_ngrams(current_patterns):
+            totals[(n, ngram)] += 1
+            daily[(current_day, n, ngram)] += 1
+
+    result = await db.stream(stmt)
+    async for progression_id, updated_at, created_at, chords in result:
+        if progression_id != current_id:
+            if current_id is not None:
+                commit_current()
+            current_id = progression_id
+            current_day = (updated_at or created_at).date()
+            current_patterns = []
+        current_patterns.append(chords)
+    if current_id is not None:
+        commit_current()
+    return totals, daily
+
+
+async def load_stored(db: AsyncSession) -> Tuple[Counter, Counter]:
+    """テーブルに保存されている集計値(0件の行は除く)"""
+    totals: Counter = Counter()
+    daily: Counter = Counter()
+    result = await db.stream(select(ChordNgramStat.n, ChordNgramStat.ngram, ChordNgramStat.count))
+    async for n, ngram, count in result:
+        if count:
+            totals[(n, ngram)] = count
+    result = await db.stream(select(
+        ChordNgramDaily.day, ChordNgramDaily.n, ChordNgramDaily.ngram, ChordNgramDaily.count
+    ))
+    async for day, n, ngram, count in result:
+        if count:
+            daily[(day, n, ngram)] = count
+    return totals, daily
+
+
+def _diff_count(expected: Counter, stored: Counter) -> int:
+    keys = set(expected) | set(stored)
+    return sum(1 for key in keys if expected.get(key, 0) != stored.get(key, 0))
+
+
+async def rebuild(check_only: bool = False) -> int:
+    """集計値を全件から再構築し、保存値との不一致件数を返す
+
+    Args:
+        check_only: Trueの場合は比較のみ行い、テーブルを書き換えない
+    """
+    from database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        # 承認処理と競合しないよう一貫したスナップショットで読む
+        await db.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+        totals, daily = await compute_from_scratch(db)
+        stored_totals, stored_daily = await load_stored(db)
+        mismatches = _diff_count(totals, stored_totals) + _diff_count(daily, stored_daily)
+        print(f"n-gram: {len(totals)}件 / 日別: {len(daily)}件 / 不一致: {mismatches}件")
+
+        if check_only:
+            await db.rollback()
+            return mismatches
+
+        # 累計は日別の合計と一致するため、日別から両テーブルを作り直す
+        await db.execute(delete(ChordNgramStat))
+        await db.execute(delete(ChordNgramDaily))
+        await apply_deltas(db, daily)
+        await db.commit()
+        print("集計値を再構築しました")
+        return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="コード進行統計の管理")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subparsers.add_parser("rebuild", help="集計値を全件から再構築")
+    rebuild_parser.add_argument("--check", action="store_true", help="比較のみ行い書き換えない")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        mismatches = asyncio.run(rebuild(check_only=args.check))
+        raise SystemExit(1 if args.check and mismatches else 0)
@@ -0,0 +1,175 @@
+"""シリアライズ性能のベンチマーク
+
+DBを使わずにダミーデータでレスポンス生成のCPUコストを計測する。
+キー指定(key=)時の音名変換のコストも合わせて計測する。
+
+使い方:
+    python benchmark.py [件数]
+"""
+
+import copy
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+import serializers
+from chord_utils import DEGREES, _spell_root, normalize_chord, render_patterns
+from schemas import ProgressionListResponse, ProgressionResponse
+
+SAMPLE_CHORDS = ["IV", "V", "IIIm", "VIm", "IIm7", "V7", "Imaj7", None]
+# 音名変換用(変化記号・分数コードを含む)
+KEY_SAMPLE_CHORDS = SAMPLE_CHORDS + ["bVIImaj7", "#IVm7b5", "IV/V", "Ⅵm"]
+
+
+def make_rows(count: int):
+    """ダミーの進行データを生成
+
+    Returns:
+        tuple: (ORM風オブジェクトのリスト, 一覧用行タプル, 詳細用行タプル, パターンmap, 楽曲map)
+    """
+    base = datetime(2024, 1, 1, 12, 0, 0, 123456)
+    objects, list_rows, detail_rows = [], [], []
+    patterns_map, songs_map = {}, {}
+    for i in range(count):
+        pid = uuid.uuid4()
+        created = base + timedelta(minutes=i)
+        patterns = [
+            {
+                "label": f"パターン{j + 1}",
+                "chords": [SAMPLE_CHORDS[(i + j + k) % len(SAMPLE_CHORDS)] for k in range(16)],
+                "id": uuid.uuid4(),
+                "sort_order": j,
+            }
+            for j in range(2)
+        ]
+        songs = [
+            {
+                "name": f"楽曲{i}",
+                "artist": "アーティスト",
+                "youtube_url": "https://www.youtube.com/watch?v=xxxx",
+                "spotify_url": None,
+                "apple_music_url": None,
+                "id": uuid.uuid4(),
+            }
+        ]
+        obj = SimpleNamespace(
+            id=pid, title=f"王道進行 {i}", remarks="よく使われる進行", status="approved",
+            normalized_chords="IV|V|IIIm|VIm", created_at=created, updated_at=created,
+            original_id=None, ip_address="127.0.0.1",
+            patterns=[SimpleNamespace(**p) for p in patterns],
+            songs=[SimpleNamespace(**s) for s in songs],
+        )
+        objects.append(obj)
+        list_rows.append((pid, obj.title, obj.remarks, obj.status, created))
+        detail_rows.append((obj.title, obj.remarks, pid, obj.status, obj.normalized_chords,
+                            created, created, None, obj.ip_address))
+        patterns_map[pid] = patterns
+        songs_map[pid] = songs
+    return objects, list_rows, detail_rows, patterns_map, songs_map
+
+
+def timeit(func, repeat: int = 5) -> float:
+    """最速実行時間(秒)を返す"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_serialization(count: int = 1000) -> None:
+    """response_model経由と高速パスのCPU時間を比較"""
+    objects, list_rows, detail_rows, patterns_map, songs_map = make_rows(count)
+    list_adapter = TypeAdapter(List[ProgressionListResponse])
+    detail_adapter = TypeAdapter(List[ProgressionResponse])
+
+    def default_path(adapter):
+        content = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+        return JSONResponse(content).body
+
+    def fast_list():
+        return serializers.dumps([serializers.list_item(r, patterns_map[r[0]]) for r in list_rows])
+
+    def fast_detail():
+        return serializers.dumps([
+            serializers.detail_item(r, patterns_map[r[2]], songs_map[r[2]]) for r in detail_rows
+        ])
+
+    for name, adapter, fast in (("list", list_adapter, fast_list), ("detail", detail_adapter, fast_detail)):
+        assert default_path(adapter) == fast(), f"{name}: 出力が一致しません"
+        slow_t = timeit(lambda: default_path(adapter))
+        fast_t = timeit(fast)
+        print(f"[{name}] {count}件: response_model {slow_t * 1000:.2f}ms / "
+              f"fast {fast_t * 1000:.2f}ms (x{slow_t / fast_t:.1f})")
+
+
+def render_chord_naive(chord, key):
+    """表を使わず1コードずつ解析して変換する(比較用)"""
+    if not chord:
+        return chord
+    chord = normalize_chord(chord)
+    head, _, bass = chord.partition("/")
+
+    def split(text):
+        modifier = text[0] if text[:1] in ("#", "b") else ""
+        rest = text[len(modifier):]
+        degree = max((d for d in DEGREES if rest.startswith(d)), key=len, default=None)
+        if degree is None:
+            return None
+        return _spell_root(key, DEGREES.index(degree), modifier), rest[len(degree):]
+
+    parsed = split(head)
+    if parsed is None:
+        return chord
+    rendered = parsed[0] + parsed[1]
+    if bass:
+        bass_parsed = split(bass)
+        rendered += "/" + (bass_parsed[0] if bass_parsed else bass)
+    return rendered
+
+
+def bench_key_rendering(count: int = 1000) -> None:
+    """音名変換(表引きの一括変換と1コードずつの解析)とJSON生成のCPU時間を比較"""
+    _, list_rows, _, patterns_map, _ = make_rows(count)
+    for i, patterns in enumerate(patterns_map.values()):
+        for j, pattern in enumerate(patterns):
+            pattern["chords"] = [
+                KEY_SAMPLE_CHORDS[(i + j + k) % len(KEY_SAMPLE_CHORDS)] for k in range(16)
+            ]
+    all_patterns = [p for patterns in patterns_map.values() for p in patterns]
+    key = "Eb"
+
+    def table():
+        render_patterns(all_patterns, key)
+
+    def naive():
+        for pattern in all_patterns:
+            pattern["rendered_chords"] = [render_chord_naive(c, key) for c in pattern["chords"]]
+
+    table()
+    expected = copy.deepcopy(all_patterns)
+    naive()
+    assert all_patterns == expected, "表引きと解析の変換結果が一致しません"
+
+    def dumps():
+        return serializers.dumps([serializers.list_item(r, patterns_map[r[0]]) for r in list_rows])
+
+    slots = sum(len(p["chords"]) for p in all_patterns)
+    table_t = timeit(table)
+    naive_t = timeit(naive)
+    dumps_t = timeit(dumps)
+    print(f"[key] {count}件({slots}枠): table {table_t * 1000:.2f}ms / "
+          f"naive {naive_t * 1000:.2f}ms (x{naive_t / table_t:.1f}) / JSON生成 {dumps_t * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    bench_serialization(count)
+    bench_key_rendering(count)
@@ -1,10 +1,12 @@
 """コード進行ユーティリティ
 
-コード表記の正規化、検索用文字列生成、度数・クオリティオプション提供など。
+コード表記の正規化、検索用文字列生成、度数・クオリティオプション提供、
+度数表記から指定キーの音名表記への変換など。
 """
 
 import re
-from typing import List, Optional
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
 
 
 def normalize_chord(chord: Optional[str]) -> str:
@@ -173,3 +175,129 @@ def get_chord_options():
         "modifiers": DEGREE_MODIFIERS,
         "qualities": QUALITIES,
     }
+
+
+# キー(メジャーキー12種、異名同音は調号の少ない方)
+KEYS = ['C', 'Db', 'D', 'Eb', 'E', 'F', 'F#', 'G', 'Ab', 'A', 'Bb', 'B']
+# 異名同音のキー → KEYSの表記
+KEY_ALIASES = {
+    'C#': 'Db', 'D#': 'Eb', 'Gb': 'F#', 'G#': 'Ab', 'A#': 'Bb',
+    'Cb': 'B', 'Fb': 'E', 'E#': 'F', 'B#': 'C',
+}
+
+_LETTERS = 'CDEFGAB'
+# 幹音(C〜B)の音高
+_NATURAL_PITCHES = [0, 2, 4, 5, 7, 9, 11]
+# メジャースケールの各度数の音高(I〜VII)
+_MAJOR_SCALE = [0, 2, 4, 5, 7, 9, 11]
+_MODIFIER_SEMITONES = {'': 0, '#': 1, 'b': -1}
+_ACCIDENTALS = {0: '', 1: '#', 2: '##', -1: 'b', -2: 'bb'}
+
+
+def _spell_root(key: str, degree_index: int, modifier: str) -> str:
+    """キーと度数から根音の音名を求める
+    
+    度数ごとに音名の文字(C〜B)をキーの主音から順に割り当て、
+    臨時記号で音高を合わせる(例: Fキーの IV → Bb、bVII → Eb)。
+    """
+    tonic_letter = _LETTERS.index(key[0])
+    tonic_pitch = _NATURAL_PITCHES[tonic_letter] + _MODIFIER_SEMITONES[key[1:]]
+    letter = (tonic_letter + degree_index) % 7
+    pitch = tonic_pitch + _MAJOR_SCALE[degree_index] + _MODIFIER_SEMITONES[modifier]
+    accidental = (pitch - _NATURAL_PITCHES[letter] + 6) % 12 - 6
+    return _LETTERS[letter] + _ACCIDENTALS[accidental]
+
+
+def _build_key_tables():
+    """キーごとの根音表(bVII → Eb)とコード表(bVIImaj7 → Ebmaj7)を生成"""
+    roots: Dict[str, Dict[str, str]] = {}
+    chords: Dict[str, Dict[str, str]] = {}
+    for key in KEYS:
+        roots[key] = {}
+        chords[key] = {}
+        for i, degree in enumerate(DEGREES):
+            for modifier in DEGREE_MODIFIERS:
+                root = _spell_root(key, i, modifier)
+                roots[key][modifier + degree] = root
+                for quality in QUALITIES:
+                    chords[key][modifier + degree + quality] = root + quality
+    return roots, chords
+
+
+# キー → 度数(変化記号付き) → 根音の音名
+KEY_ROOT_TABLE, KEY_CHORD_TABLE = _build_key_tables()
+
+
+def parse_key(name: Optional[str]) -> Optional[str]:
+    """キー名をKEYSの表記に変換(不明な場合はNone)
+    
+    大文字・小文字は区別しない。
+    例: "f#" → "F#", "Gb" → "F#", "B♭" → "Bb", "EB" → "Eb"
+    """
+    if not name:
+        return None
+    name = normalize_chord(name.strip())
+    if not name:
+        return None
+    name = name[0].upper() + name[1:].lower()
+    name = KEY_ALIASES.get(name, name)
+    return name if name in KEY_CHORD_TABLE else None
+
+
+# 表にない表記(全角文字・分数コード)の変換結果のキャッシュ件数
+MAX_CACHED_RENDERED_CHORDS = 4096
+
+
+@lru_cache(maxsize=MAX_CACHED_RENDERED_CHORDS)
+def _render_uncommon_chord(chord: str, key: str) -> Optional[str]:
+    """表にない表記を正規化・分解して変換(変換できない場合はNone)"""
+    table = KEY_CHORD_TABLE[key]
+    normalized = normalize_chord(chord)
+    rendered = table.get(normalized)
+    if rendered is None and '/' in normalized:
+        head, _, bass = normalized.partition('/')
+        head_rendered = table.get(head)
+        bass_rendered = KEY_ROOT_TABLE[key].get(bass)
+        if head_rendered is not None and bass_rendered is not None:
+            rendered = f"{head_rendered}/{bass_rendered}"
+    return rendered
+
+
+def render_chord(chord: Optional[str], key: str) -> Optional[str]:
+    """度数表記のコードを指定キーの音名表記に変換
+    
+    表にない表記(全角文字・分数コード)は正規化・分解して変換する。
+    その結果は表とは別の件数上限付きキャッシュに保持し、表自体は変更しない。
+    変換できない表記はそのまま返す。
+    
+    Args:
+        chord: コード文字列(例: "IVmaj7", "Ⅴ/Ⅶ")
+        key: KEYSのいずれか
+    
+    Returns:
+        音名表記のコード(例: Fキーなら "Bbmaj7", "C/E")
+    """
+    if not chord:
+        return chord
+    rendered = KEY_CHORD_TABLE[key].get(chord)
+    if rendered is None:
+        rendered = _render_uncommon_chord(chord, key)
+    return chord if rendered is None else rendered
+
+
+def render_patterns(patterns: Iterable[dict], key: str) -> None:
+    """パターン群のコードを指定キーで一括変換
+    
+    各パターンdictにrendered_chords(chordsと同じ16枠の音名表記)を追加する。
+    ページ内の全パターンを1回の走査で変換し、ほとんどのコードは辞書引き1回で済む。
+    
+    Args:
+        patterns: PatternResponse相当のdict群
+        key: KEYSのいずれか
+    """
+    lookup = KEY_CHORD_TABLE[key].get
+    for pattern in patterns:
+        pattern["rendered_chords"] = [
+            (lookup(chord) or render_chord(chord, key)) if chord else chord
+            for chord in pattern["chords"] or []
+        ]
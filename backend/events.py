@@ -0,0 +1,218 @@
+"""管理画面向けのリアルタイム通知
+
+承認待ちキューの変化(新規投稿・承認/却下)をPostgreSQLのLISTEN/NOTIFYで
+全ワーカーに配信し、各ワーカーが接続中のSSEクライアントへ中継する。
+
+- 送信側: notify()を投稿と同じトランザクション内で実行(コミット時に配信)
+- 受信側: PendingBroadcasterがワーカーごとに1本のLISTEN専用接続を保持
+  (SSE購読者への中継に加え、キャッシュ無効化などのハンドラーも呼び出す)
+  接続が切れた場合はバックオフ付きで再接続し、切断中に取りこぼした
+  イベントの分は再接続ハンドラー(キャッシュの全破棄など)で補う
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Iterable, List, Optional, Set
+
+import asyncpg
+from sqlalchemy import select, func, text, bindparam, Text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import serializers
+
+logger = logging.getLogger(__name__)
+
+# NOTIFYチャンネル名
+PENDING_CHANNEL = "pending_progressions"
+# SSEクライアントごとの未送信イベント上限(超えたら古いクライアントとみなし破棄)
+SUBSCRIBER_QUEUE_SIZE = 100
+# SSEのハートビート間隔(秒)
+HEARTBEAT_INTERVAL = 15
+# LISTEN接続の死活確認間隔(秒)
+LISTEN_CHECK_INTERVAL = 10
+# 再接続の待ち時間(秒、失敗のたびに倍にして上限まで延ばす)
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+
+NOTIFY_MANY_SQL = text(
+    "SELECT pg_notify(:channel, payload) FROM unnest(:payloads) AS payload"
+).bindparams(bindparam("payloads", type_=ARRAY(Text)))
+
+
+async def notify(db: AsyncSession, event: str, data: Any) -> None:
+    """承認待ちキューのイベントを発行
+
+    NOTIFYはトランザクションのコミット時に配信されるため、
+    ロールバックされた投稿が通知されることはない。
+
+    Args:
+        db: データベースセッション(コミット前)
+        event: イベント名("pending" / "processed")
+        data: JSON化可能なイベントデータ
+    """
+    payload = serializers.dumps({"event": event, "data": data}).decode("utf-8")
+    await db.execute(select(func.pg_notify(PENDING_CHANNEL, payload)))
+
+
+async def notify_many(db: AsyncSession, event: str, items: Iterable[Any]) -> None:
+    """同じ種類のイベントを1文でまとめて発行(一括却下など)"""
+    payloads = [serializers.dumps({"event": event, "data": data}).decode("utf-8") for data in items]
+    if payloads:
+        await db.execute(NOTIFY_MANY_SQL, {"channel": PENDING_CHANNEL, "payloads": payloads})
+
+
+class PendingBroadcaster:
+    """LISTEN接続で受け取ったイベントをSSE購読者へ配信する"""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.handlers: List[Callable[[dict], None]] = []
+        self.reconnect_handlers: List[Callable[[], None]] = []
+        self._conn: Optional[asyncpg.Connection] = None
+        self._lost = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.reconnects = 0
+
+    async def start(self) -> None:
+        """LISTEN接続の維持を開始(接続できなくてもAPI自体は起動させる)"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._close()
+
+    async def _connect(self) -> None:
+        self._lost.clear()
+        conn = await asyncpg.connect(self.dsn)
+        try:
+            conn.add_termination_listener(self._on_terminate)
+            await conn.add_listener(PENDING_CHANNEL, self._on_notify)
+        except BaseException:
+            await conn.close()
+            raise
+        self._conn = conn
+
+    async def _close(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None and not conn.is_closed():
+            try:
+                await conn.close()
+            except (OSError, asyncpg.PostgresError):
+                conn.terminate()
+
+    def _on_terminate(self, conn) -> None:
+        self._lost.set()
+
+    async def _run(self) -> None:
+        """接続・死活確認・再接続のループ"""
+        delay = RECONNECT_MIN_DELAY
+        first = True
+        while True:
+            try:
+                await self._connect()
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning("承認待ち通知のLISTENを開始できませんでした(%g秒後に再試行): %s", delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                first = False
+                continue
+            delay = RECONNECT_MIN_DELAY
+            if not first:
+                # 切断中のイベントは届かないため、依存するキャッシュを破棄させる
+                self.reconnects += 1
+                logger.info("承認待ち通知のLISTENを再開しました")
+                for handler in self.reconnect_handlers:
+                    handler()
+            first = False
+            await self._wait_lost()
+            logger.warning("承認待ち通知のLISTEN接続が切断されました")
+            await self._close()
+
+    async def _wait_lost(self) -> None:
+        """接続が切れるまで待つ(終了通知に加え、一定間隔で疎通を確認)"""
+        while True:
+            try:
+                await asyncio.wait_for(self._lost.wait(), LISTEN_CHECK_INTERVAL)
+                return
+            except asyncio.TimeoutError:
+                pass
+            if self._conn is None or self._conn.is_closed():
+                return
+            try:
+                await asyncio.wait_for(self._conn.execute("SELECT 1"), LISTEN_CHECK_INTERVAL)
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError):
+                return
+
+    @property
+    def connected(self) -> bool:
+        return self._conn is not None and not self._conn.is_closed()
+
+    def add_handler(self, handler: Callable[[dict], None]) -> None:
+        """受信した全イベントで呼び出すハンドラーを登録"""
+        self.handlers.append(handler)
+
+    def add_reconnect_handler(self, handler: Callable[[], None]) -> None:
+        """LISTEN接続を張り直した時(切断中のイベントを取りこぼした可能性がある時)に呼び出すハンドラーを登録"""
+        self.reconnect_handlers.append(handler)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.subscribers.discard(queue)
+
+    def _on_notify(self, conn, pid, channel, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        for handler in self.handlers:
+            handler(message)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # 読み出しが追いつかないクライアントは終端(None)を送って切断させる
+                self.subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Server-Sent Events形式の1メッセージを生成"""
+    return f"event: {event}\ndata: {serializers.dumps(data).decode('utf-8')}\n\n"
+
+
+async def stream(broadcaster: PendingBroadcaster, request):
+    """SSEレスポンス用の非同期ジェネレーター
+
+    購読キューのイベントを中継し、一定間隔でハートビートを送る。
+    クライアント切断時または購読が破棄された時点で終了する。
+    """
+    queue = broadcaster.subscribe()
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            if message is None:
+                break
+            yield format_sse(message["event"], message["data"])
+    finally:
+        broadcaster.unsubscribe(queue)
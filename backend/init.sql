@@ -20,6 +20,20 @@ CREATE TABLE patterns (
     sort_order INT DEFAULT 0
 );
 
+-- トライグラム検索用拡張
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- 楽曲カタログテーブル（正規化した曲名・アーティスト名とURLで重複を除く）
+CREATE TABLE song_catalog (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    song_key TEXT NOT NULL UNIQUE,
+    canonical_name TEXT NOT NULL,
+    canonical_artist TEXT NOT NULL DEFAULT '',
+    youtube_url TEXT,
+    spotify_url TEXT,
+    apple_music_url TEXT
+);
+
 -- 関連楽曲テーブル
 CREATE TABLE songs (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -28,7 +42,32 @@ CREATE TABLE songs (
     artist VARCHAR(255),
     youtube_url TEXT,
     spotify_url TEXT,
-    apple_music_url TEXT
+    apple_music_url TEXT,
+    catalog_id UUID REFERENCES song_catalog(id) -- 楽曲カタログ
+);
+
+-- 閲覧数カウンターテーブル（アプリ側で集計し定期的に加算）
+CREATE TABLE progression_views (
+    progression_id UUID PRIMARY KEY REFERENCES progressions(id) ON DELETE CASCADE,
+    view_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- コードn-gram累計テーブル（承認時に差分を加算）
+CREATE TABLE chord_ngram_stats (
+    n SMALLINT NOT NULL,
+    ngram TEXT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (n, ngram)
+);
+
+-- コードn-gram日別テーブル（トレンド集計用）
+CREATE TABLE chord_ngram_daily (
+    day DATE NOT NULL,
+    n SMALLINT NOT NULL,
+    ngram TEXT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, n, ngram)
 );
 
 -- IPアドレス制限テーブル
@@ -47,12 +86,31 @@ CREATE TABLE feedbacks (
     ip_address VARCHAR(45)
 );
 
+-- IPアドレス別投稿数テーブル（1時間単位、投稿と同じトランザクションで加算）
+CREATE TABLE ip_activity (
+    hour TIMESTAMP NOT NULL,
+    ip_address VARCHAR(45) NOT NULL,
+    posts INT NOT NULL DEFAULT 0,
+    edits INT NOT NULL DEFAULT 0,
+    feedbacks INT NOT NULL DEFAULT 0,
+    rejections INT NOT NULL DEFAULT 0,
+    last_at TIMESTAMP,
+    PRIMARY KEY (hour, ip_address)
+);
+
 -- インデックス
 CREATE INDEX idx_progressions_status ON progressions(status);
 CREATE INDEX idx_progressions_normalized_chords ON progressions(normalized_chords);
 CREATE INDEX idx_progressions_title ON progressions(title);
+CREATE INDEX idx_progressions_ip_created ON progressions(ip_address, created_at);
+CREATE INDEX idx_feedbacks_ip_created ON feedbacks(ip_address, created_at);
 CREATE INDEX idx_patterns_progression_id ON patterns(progression_id);
 CREATE INDEX idx_songs_progression_id ON songs(progression_id);
+CREATE INDEX idx_songs_catalog_id ON songs(catalog_id);
+CREATE INDEX idx_song_catalog_name_trgm ON song_catalog USING gin (canonical_name gin_trgm_ops);
+CREATE INDEX idx_song_catalog_artist_trgm ON song_catalog USING gin (canonical_artist gin_trgm_ops);
+CREATE INDEX idx_progression_views_view_count ON progression_views(view_count DESC);
+CREATE INDEX idx_chord_ngram_stats_n_count ON chord_ngram_stats(n, count DESC);
 
 -- 更新日時を自動更新するトリガー
 CREATE OR REPLACE FUNCTION update_updated_at()
@@ -0,0 +1,244 @@
+"""IPアドレス別の投稿アクティビティ
+
+スパム対策の判断材料として、IPアドレスごとの投稿数を1時間単位の
+カウンター(ip_activity)に集計する。投稿・フィードバック・却下と同じ
+トランザクションで加算するため、progressions/feedbacksを集計し直す必要はない。
+却下された投稿は削除されるが、カウンターには却下数として残る。
+
+- posts: 新規投稿数
+- edits: 編集リクエスト数
+- feedbacks: ご意見・ご感想の投稿数
+- rejections: 却下された投稿数(却下時刻の時間帯に加算)
+
+保持期間(IP_ACTIVITY_RETENTION_DAYS)を過ぎたバケットは起動時に削除する。
+集計値は再構築コマンドで保持期間内の投稿から数え直せる:
+    python ip_activity.py rebuild
+却下された投稿は削除済みで数え直せないため、却下数は既存の値を引き継ぎ、
+投稿数・編集数は数え直した値と既存の値の大きい方を残す(既存の値がないバケットでは
+却下済みの投稿の分だけ少なくなる)。承認済みの編集は新規投稿として数える。
+"""
+
+import argparse
+import asyncio
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, delete, func, and_, text, bindparam, DateTime, Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+import serializers
+from models import Progression, Feedback, BlockedIP, IpActivity
+
+# カウンターの保持日数(集計期間の上限)
+RETENTION_DAYS = int(os.getenv("IP_ACTIVITY_RETENTION_DAYS", "30"))
+
+KINDS = ("posts", "edits", "feedbacks", "rejections")
+
+# (IPアドレス, 種別) → 件数
+ActivityDeltas = Dict[Tuple[str, str], int]
+
+UPSERT_SQL = text("""
+    INSERT INTO ip_activity (hour, ip_address, posts, edits, feedbacks, rejections, last_at)
+    SELECT * FROM unnest(:hours, :ips, :posts, :edits, :feedbacks, :rejections, :last_ats)
+    ON CONFLICT (hour, ip_address) DO UPDATE
+    SET posts = ip_activity.posts + EXCLUDED.posts,
+        edits = ip_activity.edits + EXCLUDED.edits,
+        feedbacks = ip_activity.feedbacks + EXCLUDED.feedbacks,
+        rejections = ip_activity.rejections + EXCLUDED.rejections,
+        last_at = GREATEST(ip_activity.last_at, EXCLUDED.last_at)
+""").bindparams(
+    bindparam("hours", type_=ARRAY(DateTime)),
+    bindparam("last_ats", type_=ARRAY(DateTime)),
+    bindparam("ips", type_=ARRAY(String)),
+    *[bindparam(kind, type_=ARRAY(Integer)) for kind in KINDS],
+)
+
+# 既存DB向けのインデックス追加(create_allは既存テーブルへのインデックス追加を行わないため)
+MIGRATION_SQL = (
+    "CREATE INDEX IF NOT EXISTS idx_progressions_ip_created ON progressions(ip_address, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_feedbacks_ip_created ON feedbacks(ip_address, created_at)",
+)
+
+
+def _hour(at: datetime) -> datetime:
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+async def _upsert(db: AsyncSession, buckets: Dict[Tuple[datetime, str], Counter], last_at: Dict[Tuple[datetime, str], datetime]) -> None:
+    """(時間帯, IPアドレス) → 種別ごとの件数 を1文で加算"""
+    keys = list(buckets)
+    params = {
+        "hours": [hour for hour, _ in keys],
+        "ips": [ip for _, ip in keys],
+        "last_ats": [last_at[key] for key in keys],
+    }
+    for kind in KINDS:
+        params[kind] = [buckets[key][kind] for key in keys]
+    await db.execute(UPSERT_SQL, params)
+
+
+async def record(db: AsyncSession, deltas: ActivityDeltas, at: Optional[datetime] = None) -> None:
+    """アクティビティを加算(呼び出し元のトランザクション内で実行)
+
+    Args:
+        db: データベースセッション(コミット前)
+        deltas: (IPアドレス, 種別) → 件数
+        at: 発生時刻(省略時は現在時刻、UTC)
+    """
+    deltas = {key: value for key, value in deltas.items() if key[0] and value}
+    if not deltas:
+        return
+    at = at or datetime.utcnow()
+    buckets: Dict[Tuple[datetime, str], Counter] = {}
+    for (ip, kind), value in deltas.items():
+        buckets.setdefault((_hour(at), ip), Counter())[kind] += value
+    await _upsert(db, buckets, {key: at for key in buckets})
+
+
+async def top_submitters(db: AsyncSession, hours: int, limit: int) -> List[dict]:
+    """直近hours時間の投稿数が多いIPアドレス
+
+    ブロック済みかどうかと、現在の承認待ち件数を合わせて返す。
+    """
+    since = _hour(datetime.utcnow()) - timedelta(hours=hours - 1)
+    total = func.sum(IpActivity.posts + IpActivity.edits + IpActivity.feedbacks).label("total")
+    stmt = select(
+        IpActivity.ip_address,
+        total,
+        func.sum(IpActivity.posts),
+        func.sum(IpActivity.edits),
+        func.sum(IpActivity.feedbacks),
+        func.sum(IpActivity.rejections),
+        func.max(IpActivity.last_at),
+    ).where(
+        IpActivity.hour >= since
+    ).group_by(IpActivity.ip_address).order_by(
+        total.desc(), func.max(IpActivity.last_at).desc()
+    ).limit(limit)
+    result = await db.execute(stmt)
+    rows = result.all()
+    ips = [row[0] for row in rows]
+    if not ips:
+        return []
+
+    # 承認待ち件数(ip_address, created_atインデックスを使用)
+    stmt = select(Progression.ip_address, func.count()).where(
+        and_(Progression.ip_address.in_(ips), Progression.status == "pending")
+    ).group_by(Progression.ip_address)
+    result = await db.execute(stmt)
+    pending = dict(result.all())
+
+    stmt = select(BlockedIP.ip_address).where(BlockedIP.ip_address.in_(ips))
+    result = await db.execute(stmt)
+    blocked = set(result.scalars().all())
+
+    return [
+        {
+            "ip_address": ip,
+            "total": int(total_count),
+            "posts": int(posts),
+            "edits": int(edits),
+            "feedbacks": int(feedbacks),
+            "rejections": int(rejections),
+            "pending": pending.get(ip, 0),
+            "last_at": last_at,
+            "blocked": ip in blocked,
+        }
+        for ip, total_count, posts, edits, feedbacks, rejections, last_at in rows
+    ]
+
+
+async def recent_submissions(db: AsyncSession, ip: str, limit: int) -> Tuple[Sequence, Sequence]:
+    """IPアドレスの最近の承認待ち投稿とフィードバック(新しい順)
+
+    Returns:
+        tuple: (SUMMARY_COLUMNSの行リスト, Feedbackリスト)
+    """
+    stmt = select(*serializers.SUMMARY_COLUMNS).where(
+        and_(Progression.ip_address == ip, Progression.status == "pending")
+    ).order_by(Progression.created_at.desc()).limit(limit)
+    result = await db.execute(stmt)
+    pending = result.all()
+
+    stmt = select(Feedback).where(
+        Feedback.ip_address == ip
+    ).order_by(Feedback.created_at.desc()).limit(limit)
+    result = await db.execute(stmt)
+    return pending, result.scalars().all()
+
+
+async def prune(conn: AsyncConnection) -> None:
+    """保持期間を過ぎたバケットを削除(冪等)"""
+    cutoff = _hour(datetime.utcnow()) - timedelta(days=RETENTION_DAYS)
+    await conn.execute(delete(IpActivity).where(IpActivity.hour < cutoff))
+
+
+async def migrate(conn: AsyncConnection) -> None:
+    """既存のprogressions/feedbacksにIPアドレス用インデックスを追加(create_allの後に実行、冪等)"""
+    for statement in MIGRATION_SQL:
+        await conn.execute(text(statement))
+
+
+async def rebuild() -> int:
+    """保持期間内の投稿・フィードバックからカウンターを数え直し、バケット数を返す
+
+    却下された投稿は削除済みのため、却下数は既存の値を引き継ぎ、
+    投稿数・編集数は数え直した値より既存の値が大きければ既存の値を残す。
+    """
+    from database import AsyncSessionLocal
+
+    since = _hour(datetime.utcnow()) - timedelta(days=RETENTION_DAYS)
+    async with AsyncSessionLocal() as db:
+        buckets: Dict[Tuple[datetime, str], Counter] = {}
+        last_at: Dict[Tuple[datetime, str], datetime] = {}
+
+        def add(ip: Optional[str], kind: str, at: datetime, count: int = 1) -> None:
+            if not ip or not count:
+                return
+            key = (_hour(at), ip)
+            buckets.setdefault(key, Counter())[kind] += count
+            if key not in last_at or at > last_at[key]:
+                last_at[key] = at
+
+        result = await db.stream(select(
+            Progression.ip_address, Progression.original_id, Progression.created_at
+        ).where(Progression.created_at >= since))
+        async for ip, original_id, created_at in result:
+            add(ip, "edits" if original_id else "posts", created_at)
+
+        result = await db.stream(select(
+            Feedback.ip_address, Feedback.created_at
+        ).where(Feedback.created_at >= since))
+        async for ip, created_at in result:
+            add(ip, "feedbacks", created_at)
+
+        # 削除済み(却下済み)の投稿の分は既存のカウンターから引き継ぐ
+        result = await db.stream(select(
+            IpActivity.hour, IpActivity.ip_address, IpActivity.posts, IpActivity.edits,
+            IpActivity.rejections, IpActivity.last_at
+        ).where(IpActivity.hour >= since))
+        async for hour, ip, posts, edits, rejections, at in result:
+            counts = buckets.get((hour, ip), Counter())
+            add(ip, "posts", at or hour, max(posts - counts["posts"], 0))
+            add(ip, "edits", at or hour, max(edits - counts["edits"], 0))
+            add(ip, "rejections", at or hour, rejections)
+
+        await db.execute(delete(IpActivity))
+        if buckets:
+            await _upsert(db, buckets, last_at)
+        await db.commit()
+        print(f"{len(buckets)}件のバケットを再構築しました")
+        return len(buckets)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IPアクティビティの管理")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="保持期間内の投稿からカウンターを再構築")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        asyncio.run(rebuild())
@@ -0,0 +1,178 @@
+"""ルート種別ごとの同時実行制限(ロードシェディング)
+
+重い検索が接続プールを占有して詳細表示や投稿を巻き込まないよう、
+エンドポイントを種別(search / detail / write / admin)に分け、
+種別ごとに同時実行数・待ち行列長・PostgreSQLのstatement_timeoutを設定する。
+
+- 同時実行数を超えた要求は待ち行列で最大QUEUE_WAIT_SECONDS秒待機
+- 待ち行列が満杯、または待機がタイムアウトした場合は即座に503を返す
+- 種別ごとに同時実行数と同じ大きさの専用接続プールを持ち、statement_timeoutは
+  接続時に設定する(クエリごとのSETは不要)。database.engineのプールは
+  スナップショット書き出し・閲覧数フラッシュなどのバックグラウンド処理専用になる
+- 各種別の設定は環境変数で上書き可能(例: LIMIT_SEARCH_CONCURRENCY=8)
+
+統計値はワーカー(プロセス)単位。
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict
+
+from fastapi import HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import ASYNC_DATABASE_URL, engine
+
+# 待ち行列での最大待機時間(秒)
+QUEUE_WAIT_SECONDS = float(os.getenv("LIMIT_QUEUE_WAIT_SECONDS", "1.0"))
+# 503応答時のRetry-After(秒)
+RETRY_AFTER_SECONDS = int(os.getenv("LIMIT_RETRY_AFTER_SECONDS", "2"))
+# statement_timeoutで中断されたクエリのSQLSTATE(query_canceled)
+QUERY_CANCELED_SQLSTATE = "57014"
+
+
+@dataclass
+class RouteClassConfig:
+    """ルート種別ごとの制限値"""
+    concurrency: int  # 同時実行数
+    queue_size: int  # 待ち行列の長さ
+    statement_timeout_ms: int  # PostgreSQLのstatement_timeout(ミリ秒)
+
+
+# デフォルト値(ワーカーあたりの接続数は同時実行数の合計+database.engineのプール)
+DEFAULT_ROUTE_CLASSES: Dict[str, RouteClassConfig] = {
+    "search": RouteClassConfig(concurrency=4, queue_size=16, statement_timeout_ms=2000),
+    "detail": RouteClassConfig(concurrency=6, queue_size=32, statement_timeout_ms=1000),
+    "write": RouteClassConfig(concurrency=3, queue_size=16, statement_timeout_ms=3000),
+    "admin": RouteClassConfig(concurrency=2, queue_size=8, statement_timeout_ms=5000),
+}
+
+
+def _load_config(name: str, default: RouteClassConfig) -> RouteClassConfig:
+    """環境変数LIMIT_<NAME>_*で上書きした設定を返す"""
+    prefix = f"LIMIT_{name.upper()}_"
+    return RouteClassConfig(
+        concurrency=int(os.getenv(prefix + "CONCURRENCY", default.concurrency)),
+        queue_size=int(os.getenv(prefix + "QUEUE", default.queue_size)),
+        statement_timeout_ms=int(os.getenv(prefix + "TIMEOUT_MS", default.statement_timeout_ms)),
+    )
+
+
+def overloaded() -> HTTPException:
+    """過負荷時の503エラー"""
+    return HTTPException(
+        status_code=503,
+        detail="アクセスが集中しています。しばらくしてから再度お試しください",
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+    )
+
+
+class ConcurrencyLimiter:
+    """待ち行列付きの同時実行数リミッター"""
+
+    def __init__(self, name: str, config: RouteClassConfig):
+        self.name = name
+        self.config = config
+        self._semaphore = asyncio.Semaphore(config.concurrency)
+        # 種別専用の接続プール(実行枠の数だけ接続し、statement_timeoutは接続時に設定)
+        self.engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            echo=engine.echo,
+            pool_size=config.concurrency,
+            max_overflow=0,
+            connect_args={"server_settings": {"statement_timeout": str(config.statement_timeout_ms)}},
+        )
+        self.session_factory = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.statement_timeouts = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """実行枠を確保する(確保できなければ503)"""
+        if self._semaphore.locked() and self.waiting >= self.config.queue_size:
+            self.shed += 1
+            raise overloaded()
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), QUEUE_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            raise overloaded()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.config.concurrency,
+            "queue_size": self.config.queue_size,
+            "statement_timeout_ms": self.config.statement_timeout_ms,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "statement_timeouts": self.statement_timeouts,
+        }
+
+
+LIMITERS: Dict[str, ConcurrencyLimiter] = {
+    name: ConcurrencyLimiter(name, _load_config(name, default))
+    for name, default in DEFAULT_ROUTE_CLASSES.items()
+}
+
+
+def _session_dependency(limiter: ConcurrencyLimiter):
+    async def dependency(request: Request):
+        async with limiter.slot():
+            request.state.route_class = limiter.name
+            async with limiter.session_factory() as session:
+                yield session
+
+    return dependency
+
+
+_DEPENDENCIES = {name: _session_dependency(limiter) for name, limiter in LIMITERS.items()}
+
+
+def limited_db(route_class: str):
+    """実行枠を確保し、種別専用のプールからDBセッションを渡すDependency
+
+    get_dbの代わりに使用する。種別ごとに同じ関数を返すため、同じリクエスト内で
+    同じ種別を要求する他のDependencyとはセッション(と実行枠)を共有する。
+
+    Args:
+        route_class: ルート種別("search" / "detail" / "write" / "admin")
+    """
+    return _DEPENDENCIES[route_class]
+
+
+def record_statement_timeout(request: Request) -> None:
+    """statement_timeoutによる中断を該当ルート種別の統計に記録"""
+    route_class = getattr(request.state, "route_class", None)
+    if route_class in LIMITERS:
+        LIMITERS[route_class].statement_timeouts += 1
+
+
+async def dispose() -> None:
+    """全種別の接続プールを閉じる(シャットダウン時)"""
+    for limiter in LIMITERS.values():
+        await limiter.engine.dispose()
+
+
+def get_stats() -> dict:
+    """全ルート種別の統計値"""
+    return {name: limiter.stats() for name, limiter in LIMITERS.items()}
@@ -11,30 +11,100 @@
 """
 
 import os
+import uuid
+from collections import Counter
+from datetime import datetime
 from uuid import UUID
-from typing import List, Optional
+from typing import List, Optional, Union
 from fastapi import FastAPI, Depends, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, and_
+from sqlalchemy import select, insert, delete, func, or_, and_, literal, union_all, BigInteger
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
+from sqlalchemy.exc import DBAPIError
 
-from database import get_db, engine, Base
-from models import Progression, Pattern, Song, BlockedIP, Feedback
+from database import engine, Base, DATABASE_URL
+from models import Progression, Pattern, ProgressionView, BlockedIP, Feedback
 from schemas import (
     ProgressionCreate, ProgressionUpdate, ProgressionResponse, 
     ProgressionListResponse, AdminAction, BlockIPRequest, 
-    BlockedIPResponse, DiffResponse, FeedbackCreate, FeedbackResponse
+    BlockedIPResponse, DiffResponse, FeedbackCreate, FeedbackResponse,
+    PendingPageResponse, ChordStatsResponse, BulkBlockIPRequest, BulkBlockIPResponse,
+    IpActivityResponse, IpActivityDetailResponse
+)
+from chord_utils import normalize_chords_for_search, normalize_chord, normalize_search_query, get_chord_options, parse_key
+import serializers
+import events
+import analytics
+import song_catalog
+import ip_activity
+from search_cache import search_cache, make_search_key
+from view_counter import view_counter, MERGE_SQL as MERGE_VIEWS_SQL
+from snapshot import snapshot_publisher
+from progression_diff import build_diff, diff_cache
+from load_shedding import (
+    limited_db, record_statement_timeout, get_stats as get_load_stats,
+    dispose as dispose_limited_pools, RETRY_AFTER_SECONDS, QUERY_CANCELED_SQLSTATE
 )
-from chord_utils import normalize_chords_for_search, normalize_chord, normalize_search_query, get_chord_options
 
 # FastAPIアプリケーション初期化
 app = FastAPI(title="Chord Progress Share API", version="1.0.0")
 
+# 承認待ちキューのイベント配信(ワーカーごとに1本のLISTEN接続)
+pending_broadcaster = events.PendingBroadcaster(DATABASE_URL)
+
+
+def invalidate_processed(progression_id: UUID, action: str, is_edit: bool) -> None:
+    """承認/却下された投稿に関するキャッシュを破棄
+    
+    - 差分キャッシュ: 処理された投稿の分を破棄。編集の承認時は、同じ元投稿への
+      他の編集リクエストの差分も変わり得るため全て破棄
+    - 検索キャッシュ: 承認(=承認済みカタログの変更)時に全て破棄
+    """
+    diff_cache.discard(progression_id)
+    if action == "approve":
+        search_cache.invalidate()
+        if is_edit:
+            diff_cache.clear()
+
+
+def on_pending_event(message: dict) -> None:
+    """他ワーカーでの承認/却下をNOTIFY経由で受け取りキャッシュを破棄"""
+    if message.get("event") == "processed":
+        data = message["data"]
+        invalidate_processed(UUID(data["id"]), data.get("action"), data.get("is_edit", False))
+
+
+def on_listen_reconnect() -> None:
+    """LISTEN接続の再接続時に、切断中の承認/却下を取りこぼした可能性があるためキャッシュを全て破棄"""
+    search_cache.invalidate()
+    diff_cache.clear()
+
+
+pending_broadcaster.add_handler(on_pending_event)
+pending_broadcaster.add_reconnect_handler(on_listen_reconnect)
+
 @app.on_event("startup")
 async def startup():
     async with engine.begin() as conn:
+        await song_catalog.create_extension(conn)
         await conn.run_sync(Base.metadata.create_all)
+        await song_catalog.migrate(conn)
+        await ip_activity.migrate(conn)
+        await ip_activity.prune(conn)
+    await pending_broadcaster.start()
+    view_counter.start()
+    snapshot_publisher.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await pending_broadcaster.stop()
+    await snapshot_publisher.stop()
+    await view_counter.stop()
+    await dispose_limited_pools()
 
 # CORS設定
 # 環境変数CORS_ORIGINSで許可するオリジンを設定（カンマ区切り）
@@ -47,6 +117,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(DBAPIError)
+async def db_error_handler(request: Request, exc: DBAPIError):
+    """statement_timeoutによるクエリ中断を503に変換
+    
+    それ以外のDBエラーはそのまま送出する(500)。
+    """
+    if getattr(exc.orig, "sqlstate", None) != QUERY_CANCELED_SQLSTATE:
+        raise exc
+    record_statement_timeout(request)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "処理がタイムアウトしました。条件を絞って再度お試しください"},
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+    )
+
+
 # 環境変数から管理者パスワードを取得(デフォルト: admin123)
 # 本番環境では必ず環境変数で安全なパスワードを設定すること
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")
@@ -70,7 +156,7 @@ def get_client_ip(request: Request) -> str:
     return request.client.host if request.client else "unknown"
 
 
-async def check_ip_blocked(request: Request, db: AsyncSession = Depends(get_db)):
+async def check_ip_blocked(request: Request, db: AsyncSession = Depends(limited_db("write"))):
     """IPブロックチェック
     
     ブロックされたIPアドレスからのアクセスを拒否する。
@@ -98,20 +184,84 @@ async def check_ip_blocked(request: Request, db: AsyncSession = Depends(get_db))
 # Public Endpoints(一般ユーザー向けAPI)
 # ====================
 
+def get_render_key(
+    key: Optional[str] = Query(None, description="表示キー(例: C, F#, Bb)。指定するとパターンにrendered_chordsを追加")
+) -> Optional[str]:
+    """表示キーのクエリパラメーターを検証
+    
+    Returns:
+        str: KEYSの表記(未指定の場合None)
+    
+    Raises:
+        HTTPException: 不明なキーの場合400エラー
+    """
+    if key is None:
+        return None
+    render_key = parse_key(key)
+    if render_key is None:
+        raise HTTPException(status_code=400, detail="無効なキーです")
+    return render_key
+
+
+def apply_sort(stmt, sort: str, conditions: list):
+    """一覧クエリに並び順を適用
+    
+    popularは閲覧数のある進行(progression_viewsと結合)を閲覧数の降順に、
+    閲覧数のない進行をその後ろに新着順で並べる。両者はUNION ALLで1文にまとめ、
+    同じスナップショットから読むため、途中で閲覧数の行が作られても一覧から漏れない。
+    """
+    if sort == "popular":
+        viewed = select(
+            Progression.id.label("id"),
+            literal(0).label("unviewed"),
+            ProgressionView.view_count.label("view_count"),
+        ).join(
+            ProgressionView, ProgressionView.progression_id == Progression.id
+        ).where(and_(*conditions))
+        unviewed = select(
+            Progression.id,
+            literal(1),
+            literal(0, BigInteger),
+        ).where(and_(
+            *conditions,
+            ~select(ProgressionView.progression_id).where(
+                ProgressionView.progression_id == Progression.id
+            ).exists(),
+        ))
+        ranked = union_all(viewed, unviewed).subquery("ranked")
+        stmt = stmt.join(ranked, ranked.c.id == Progression.id).order_by(
+            ranked.c.unviewed, ranked.c.view_count.desc()
+        )
+    return stmt.order_by(Progression.created_at.desc())
+
+
 @app.get("/api/progressions", response_model=List[ProgressionListResponse])
 async def get_progressions(
     query: Optional[str] = Query(None, description="タイトル・備考検索"),
     chord_query: Optional[str] = Query(None, description="コード進行検索"),
-    db: AsyncSession = Depends(get_db)
+    song: Optional[str] = Query(None, description="曲名検索"),
+    artist: Optional[str] = Query(None, description="アーティスト名検索"),
+    sort: str = Query("new", pattern="^(new|popular)$", description="並び順(new: 新着順, popular: 閲覧数順)"),
+    key: Optional[str] = Depends(get_render_key),
+    db: AsyncSession = Depends(limited_db("search"))
 ):
-    """承認済みコード進行一覧を取得"""
-    stmt = select(Progression).where(
-        Progression.status == "approved"
-    ).options(selectinload(Progression.patterns))
+    """承認済みコード進行一覧を取得
+    
+    検索条件がある場合、ヒットしたIDリストを検索キャッシュから取得する。
+    keyを指定した場合は、ページ内の全パターンを一括で音名表記に変換して返す
+    (FAST_JSONの設定によらず高速パスで生成)。
+    """
+    # キャッシュキーと同じ正規化を検索条件にも適用する(空白のみの条件は指定なし扱い)
+    query = (query or "").strip() or None
+    chord_query = normalize_search_query(chord_query) or None
+    song = song_catalog.canonicalize(song) or None
+    artist = song_catalog.canonicalize(artist) or None
+    
+    conditions = [Progression.status == "approved"]
     
     # タイトル・備考検索
     if query:
-        stmt = stmt.where(
+        conditions.append(
             or_(
                 Progression.title.ilike(f"%{query}%"),
                 Progression.remarks.ilike(f"%{query}%")
@@ -120,23 +270,68 @@ async def get_progressions(
     
     # コード進行検索
     if chord_query:
-        # 検索クエリを正規化（全角ローマ数字→半角、区切り文字の整理）
-        normalized_query = normalize_search_query(chord_query)
-        stmt = stmt.where(
-            Progression.normalized_chords.ilike(f"%{normalized_query}%")
+        # 検索クエリは正規化済み（全角ローマ数字→半角、区切り文字の整理）
+        conditions.append(
+            Progression.normalized_chords.ilike(f"%{chord_query}%")
         )
     
-    stmt = stmt.order_by(Progression.created_at.desc())
-    result = await db.execute(stmt)
+    # 曲名・アーティスト名検索(楽曲カタログ経由)
+    if song or artist:
+        conditions.append(song_catalog.song_filter(song, artist))
+    
+    if query or chord_query or song or artist:
+        cache_key = make_search_key(query, chord_query, song, artist)
+        ids = search_cache.get(cache_key)
+        if ids is None:
+            generation = search_cache.generation
+            stmt = select(Progression.id).where(and_(*conditions))
+            result = await db.execute(stmt)
+            ids = list(result.scalars().all())
+            search_cache.put(cache_key, ids, generation)
+        if not ids:
+            return serializers.json_response([]) if serializers.FAST_JSON_ENABLED or key else []
+        # 以降はIDで絞り込む(承認済みのみが対象であることはキャッシュ無効化で担保)
+        conditions = [serializers.uuid_in(Progression.id, ids), Progression.status == "approved"]
+    
+    # 高速パス: 行タプルから直接JSONを生成
+    if serializers.FAST_JSON_ENABLED or key:
+        stmt = select(*serializers.LIST_COLUMNS).where(and_(*conditions))
+        result = await db.execute(apply_sort(stmt, sort, conditions))
+        return await serializers.render_list(db, result.all(), key)
+    
+    stmt = select(Progression).where(
+        and_(*conditions)
+    ).options(selectinload(Progression.patterns))
+    result = await db.execute(apply_sort(stmt, sort, conditions))
     return result.scalars().all()
 
 
 @app.get("/api/progressions/{progression_id}", response_model=ProgressionResponse)
 async def get_progression(
     progression_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    key: Optional[str] = Depends(get_render_key),
+    db: AsyncSession = Depends(limited_db("detail"))
 ):
-    """コード進行詳細を取得"""
+    """コード進行詳細を取得
+    
+    nginxが静的スナップショットの代わりに転送してきた場合(X-View-Recorded: 1)は、
+    閲覧数をミラーリクエスト側で記録済みのため記録しない。
+    keyを指定した場合は、パターンに音名表記(rendered_chords)を追加する。
+    """
+    record_view = request.headers.get("X-View-Recorded") != "1"
+    if serializers.FAST_JSON_ENABLED or key:
+        stmt = select(*serializers.DETAIL_COLUMNS).where(
+            and_(Progression.id == progression_id, Progression.status == "approved")
+        )
+        result = await db.execute(stmt)
+        row = result.first()
+        if not row:
+            raise HTTPException(status_code=404, detail="コード進行が見つかりません")
+        if record_view:
+            view_counter.record(progression_id)
+        return await serializers.render_detail(db, row, key)
+    
     stmt = select(Progression).where(
         and_(Progression.id == progression_id, Progression.status == "approved")
     ).options(
@@ -149,66 +344,111 @@ async def get_progression(
     if not progression:
         raise HTTPException(status_code=404, detail="コード進行が見つかりません")
     
+    # 閲覧数はメモリで集計し、定期的にまとめて書き出す
+    if record_view:
+        view_counter.record(progression_id)
     return progression
 
 
+@app.post("/internal/progressions/{progression_id}/views", status_code=204)
+async def record_progression_view(progression_id: UUID):
+    """閲覧を1件記録
+    
+    詳細を静的スナップショットから配信した際に、nginxのミラーリクエストから呼ばれる。
+    nginxは/api/以外をバックエンドへプロキシしないため、外部からは到達できない。
+    DBにはアクセスしない(承認済みでない投稿はフラッシュ時に除外される)。
+    """
+    view_counter.record(progression_id)
+    return Response(status_code=204)
+
+
+async def insert_progression(
+    db: AsyncSession,
+    data: Union[ProgressionCreate, ProgressionUpdate],
+    ip: str,
+    original_id: Optional[UUID] = None
+) -> dict:
+    """承認待ちのProgressionをパターン・楽曲ごと1トランザクションで挿入
+    
+    IDと日時はアプリ側で採番するため、flushや再SELECTは行わない。
+    パターン・楽曲は複数行INSERTでまとめて投入する。
+    
+    Args:
+        db: データベースセッション
+        data: 投稿データ
+        ip: 投稿者のIPアドレス
+        original_id: 編集リクエストの場合、元の投稿ID
+    
+    Returns:
+        dict: ProgressionResponse相当のdict(挿入したデータから構築)
+    """
+    # パターンデータを正規化
+    patterns_data = [{"chords": p.chords, "label": p.label} for p in data.patterns]
+    normalized = normalize_chords_for_search(patterns_data)
+    
+    progression_id = uuid.uuid4()
+    now = datetime.utcnow()
+    progression_row = {
+        "id": progression_id,
+        "title": data.title,
+        "remarks": data.remarks,
+        "status": "pending",
+        "normalized_chords": normalized,
+        "created_at": now,
+        "updated_at": now,
+        "ip_address": ip,
+        "original_id": original_id,
+    }
+    pattern_rows = [
+        {
+            "id": uuid.uuid4(),
+            "progression_id": progression_id,
+            "label": pattern_data.label,
+            "chords": pattern_data.chords,
+            "sort_order": i,
+        }
+        for i, pattern_data in enumerate(data.patterns)
+    ]
+    song_rows = [
+        {
+            "id": uuid.uuid4(),
+            "progression_id": progression_id,
+            "name": song_data.name,
+            "artist": song_data.artist,
+            "youtube_url": song_data.youtube_url,
+            "spotify_url": song_data.spotify_url,
+            "apple_music_url": song_data.apple_music_url,
+        }
+        for song_data in data.songs or []
+    ]
+    
+    await db.execute(insert(Progression).values(progression_row))
+    if pattern_rows:
+        await db.execute(insert(Pattern).values(pattern_rows))
+    if song_rows:
+        # 楽曲カタログへの登録(既存なら紐付け)と合わせて1文で挿入
+        await song_catalog.insert_songs(db, song_rows)
+    # 管理画面へ新着を通知(コミット時に配信)
+    await events.notify(db, "pending", serializers.summary_item((
+        progression_id, data.title, normalized[:serializers.CHORDS_PREVIEW_LENGTH],
+        len(pattern_rows), len(song_rows), original_id, ip, now
+    )))
+    # IPアドレス別の投稿数を加算
+    await ip_activity.record(db, {(ip, "edits" if original_id else "posts"): 1}, now)
+    await db.commit()
+    
+    return {**progression_row, "patterns": pattern_rows, "songs": song_rows}
+
+
 @app.post("/api/progressions", response_model=ProgressionResponse)
 async def create_progression(
     data: ProgressionCreate,
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(limited_db("write")),
     ip: str = Depends(check_ip_blocked)
 ):
     """新規コード進行を投稿(承認待ち状態)"""
-    # パターンデータを正規化
-    patterns_data = [{"chords": p.chords, "label": p.label} for p in data.patterns]
-    normalized = normalize_chords_for_search(patterns_data)
-    
-    # Progression作成
-    progression = Progression(
-        title=data.title,
-        remarks=data.remarks,
-        status="pending",
-        normalized_chords=normalized,
-        ip_address=ip
-    )
-    db.add(progression)
-    await db.flush()
-    
-    # Patterns作成
-    for i, pattern_data in enumerate(data.patterns):
-        pattern = Pattern(
-            progression_id=progression.id,
-            label=pattern_data.label,
-            chords=pattern_data.chords,
-            sort_order=i
-        )
-        db.add(pattern)
-    
-    # Songs作成
-    for song_data in data.songs or []:
-        song = Song(
-            progression_id=progression.id,
-            name=song_data.name,
-            artist=song_data.artist,
-            youtube_url=song_data.youtube_url,
-            spotify_url=song_data.spotify_url,
-            apple_music_url=song_data.apple_music_url
-        )
-        db.add(song)
-    
-    await db.commit()
-    await db.refresh(progression)
-    
-    # 関連データを含めて返す
-    stmt = select(Progression).where(
-        Progression.id == progression.id
-    ).options(
-        selectinload(Progression.patterns),
-        selectinload(Progression.songs)
-    )
-    result = await db.execute(stmt)
-    return result.scalar_one()
+    return await insert_progression(db, data, ip)
 
 
 @app.post("/api/progressions/{progression_id}/edit", response_model=ProgressionResponse)
@@ -216,68 +456,21 @@ async def request_edit(
     progression_id: UUID,
     data: ProgressionUpdate,
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(limited_db("write")),
     ip: str = Depends(check_ip_blocked)
 ):
     """既存コード進行の編集リクエスト(承認待ち状態で新規作成)"""
     # 元の投稿が存在するか確認
-    stmt = select(Progression).where(
+    stmt = select(Progression.id).where(
         and_(Progression.id == progression_id, Progression.status == "approved")
     )
     result = await db.execute(stmt)
-    original = result.scalar_one_or_none()
     
-    if not original:
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="編集対象のコード進行が見つかりません")
     
-    # パターンデータを正規化
-    patterns_data = [{"chords": p.chords, "label": p.label} for p in data.patterns]
-    normalized = normalize_chords_for_search(patterns_data)
-    
-    # 編集リクエストとして新規Progression作成
-    edit_request = Progression(
-        title=data.title,
-        remarks=data.remarks,
-        status="pending",
-        normalized_chords=normalized,
-        ip_address=ip,
-        original_id=progression_id  # 元の投稿を参照
-    )
-    db.add(edit_request)
-    await db.flush()
-    
-    # Patterns作成
-    for i, pattern_data in enumerate(data.patterns):
-        pattern = Pattern(
-            progression_id=edit_request.id,
-            label=pattern_data.label,
-            chords=pattern_data.chords,
-            sort_order=i
-        )
-        db.add(pattern)
-    
-    # Songs作成
-    for song_data in data.songs or []:
-        song = Song(
-            progression_id=edit_request.id,
-            name=song_data.name,
-            artist=song_data.artist,
-            youtube_url=song_data.youtube_url,
-            spotify_url=song_data.spotify_url,
-            apple_music_url=song_data.apple_music_url
-        )
-        db.add(song)
-    
-    await db.commit()
-    
-    stmt = select(Progression).where(
-        Progression.id == edit_request.id
-    ).options(
-        selectinload(Progression.patterns),
-        selectinload(Progression.songs)
-    )
-    result = await db.execute(stmt)
-    return result.scalar_one()
+    # 編集リクエストとして新規Progression作成(元の投稿を参照)
+    return await insert_progression(db, data, ip, original_id=progression_id)
 
 
 @app.get("/api/chord-options")
@@ -286,11 +479,27 @@ async def get_chord_options_endpoint():
     return get_chord_options()
 
 
+@app.get("/api/stats/chords", response_model=ChordStatsResponse)
+async def get_chord_stats(
+    n: int = Query(4, ge=min(analytics.NGRAM_SIZES), le=max(analytics.NGRAM_SIZES), description="n-gramの長さ"),
+    days: int = Query(7, ge=1, le=90, description="トレンド集計の日数"),
+    limit: int = Query(20, ge=1, le=100, description="取得件数"),
+    db: AsyncSession = Depends(limited_db("detail"))
+):
+    """よく使われるコード進行(n-gram)と直近のトレンドを取得"""
+    return {
+        "n": n,
+        "days": days,
+        "top": await analytics.top_ngrams(db, n, limit),
+        "trending": await analytics.trending_ngrams(db, n, days, limit),
+    }
+
+
 @app.post("/api/feedback", response_model=FeedbackResponse)
 async def create_feedback(
     data: FeedbackCreate,
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(limited_db("write")),
     ip: str = Depends(check_ip_blocked)
 ):
     """ご意見・ご感想を投稿"""
@@ -299,6 +508,7 @@ async def create_feedback(
         ip_address=ip
     )
     db.add(feedback)
+    await ip_activity.record(db, {(ip, "feedbacks"): 1})
     await db.commit()
     await db.refresh(feedback)
     return feedback
@@ -315,30 +525,77 @@ def verify_admin(password: str = Query(..., alias="admin_password")):
     return True
 
 
-@app.get("/api/admin/pending", response_model=List[ProgressionResponse])
+@app.get("/api/admin/pending", response_model=PendingPageResponse)
 async def get_pending_progressions(
-    db: AsyncSession = Depends(get_db),
+    limit: int = Query(50, ge=1, le=200, description="取得件数"),
+    offset: int = Query(0, ge=0, description="取得開始位置"),
+    db: AsyncSession = Depends(limited_db("admin")),
     _: bool = Depends(verify_admin)
 ):
-    """承認待ちの投稿一覧を取得"""
-    stmt = select(Progression).where(
-        Progression.status == "pending"
-    ).options(
-        selectinload(Progression.patterns),
-        selectinload(Progression.songs)
-    ).order_by(Progression.created_at.asc())
+    """承認待ちの投稿一覧をサマリー形式でページ取得
     
+    パターン・楽曲の詳細は含まない。詳細は差分APIで個別に取得する。
+    """
+    stmt = select(
+        func.count(), func.count(Progression.original_id)
+    ).where(Progression.status == "pending")
     result = await db.execute(stmt)
-    return result.scalars().all()
+    total, edit_count = result.one()
+    
+    stmt = select(*serializers.SUMMARY_COLUMNS).where(
+        Progression.status == "pending"
+    ).order_by(Progression.created_at.asc()).limit(limit).offset(offset)
+    result = await db.execute(stmt)
+    
+    page = {
+        "items": [serializers.summary_item(row) for row in result.all()],
+        "total": total,
+        "edit_count": edit_count,
+        "limit": limit,
+        "offset": offset,
+    }
+    if serializers.FAST_JSON_ENABLED:
+        return serializers.json_response(page)
+    return page
+
+
+@app.get("/api/admin/pending/stream")
+async def stream_pending(
+    request: Request,
+    _: bool = Depends(verify_admin)
+):
+    """承認待ちキューの変化をServer-Sent Eventsで配信
+    
+    イベント:
+    - pending: 新規投稿・編集リクエスト(サマリー)
+    - processed: 承認/却下された投稿({"id": ..., "action": ..., "is_edit": ...})
+    """
+    return StreamingResponse(
+        events.stream(pending_broadcaster, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/api/admin/pending/{progression_id}/diff", response_model=DiffResponse)
 async def get_diff(
     progression_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(limited_db("admin")),
     _: bool = Depends(verify_admin)
 ):
-    """編集リクエストの差分を取得"""
+    """編集リクエストの差分を取得
+    
+    編集リクエストの場合は元の投稿との構造差分(変更箇所のみ)を返す。
+    新規投稿の場合は比較対象がないため、投稿全体をupdatedに入れて返す。
+    結果は承認/却下されるまでキャッシュする。
+    """
+    cached = diff_cache.get(progression_id)
+    if cached is not None:
+        return cached
+    
+    # クエリ中に承認/却下された場合、古い差分をキャッシュしない
+    generation = diff_cache.generation
+    
     # 編集リクエストを取得
     stmt = select(Progression).where(
         and_(Progression.id == progression_id, Progression.status == "pending")
@@ -364,14 +621,19 @@ async def get_diff(
         result = await db.execute(stmt)
         original = result.scalar_one_or_none()
     
-    return DiffResponse(original=original, updated=updated)
+    if original:
+        diff = DiffResponse(**build_diff(original, updated))
+    else:
+        diff = DiffResponse(id=updated.id, original_id=updated.original_id, updated=updated)
+    diff_cache.put(progression_id, diff, generation)
+    return diff
 
 
 @app.post("/api/admin/pending/{progression_id}")
 async def process_pending(
     progression_id: UUID,
     action: AdminAction,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(limited_db("admin")),
     _: bool = Depends(verify_admin)
 ):
     """承認待ちの投稿を処理"""
@@ -384,23 +646,46 @@ async def process_pending(
     if not progression:
         raise HTTPException(status_code=404, detail="承認待ちの投稿が見つかりません")
     
+    is_edit = progression.original_id is not None
+    
     if action.action == "approve":
+        original = None
         if progression.original_id:
-            # 編集リクエストの場合、元の投稿を削除
             stmt = select(Progression).where(Progression.id == progression.original_id)
             result = await db.execute(stmt)
             original = result.scalar_one_or_none()
+        
+        # コード統計の差分を反映(編集リクエストの場合は元の投稿の分を差し引く)
+        await analytics.record_approval(db, progression.id, original)
+        
+        removed_ids = [original.id] if original else []
+        if progression.original_id:
+            # 編集リクエストの場合、元の投稿を削除
             if original:
+                # 閲覧数は編集後の投稿へ合算する(編集後の投稿にも行がある場合があるため)
+                await db.execute(MERGE_VIEWS_SQL, {"source": original.id, "target": progression.id})
+                await db.execute(
+                    delete(ProgressionView).where(ProgressionView.progression_id == original.id)
+                )
                 await db.delete(original)
             progression.original_id = None
         
         progression.status = "approved"
+        await events.notify(db, "processed", {"id": progression_id, "action": "approve", "is_edit": is_edit})
         await db.commit()
+        # 他ワーカーはNOTIFY経由で無効化される
+        invalidate_processed(progression_id, "approve", is_edit)
+        # 静的スナップショットを書き直す(連続した承認はまとめて反映)
+        snapshot_publisher.schedule(changed=[progression_id], removed=removed_ids)
         return {"message": "投稿を承認しました"}
     
     elif action.action == "reject":
+        # 承認待ちの投稿はコード統計に含まれないため、集計の更新は不要
         await db.delete(progression)
+        await ip_activity.record(db, {(progression.ip_address, "rejections"): 1})
+        await events.notify(db, "processed", {"id": progression_id, "action": "reject", "is_edit": is_edit})
         await db.commit()
+        invalidate_processed(progression_id, "reject", is_edit)
         return {"message": "投稿を却下しました"}
     
     else:
@@ -409,7 +694,7 @@ async def process_pending(
 
 @app.get("/api/admin/blocked-ips", response_model=List[BlockedIPResponse])
 async def get_blocked_ips(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(limited_db("admin")),
     _: bool = Depends(verify_admin)
 ):
     """ブロック中のIPアドレス一覧を取得"""
@@ -421,7 +706,7 @@ async def get_blocked_ips(
 @app.post("/api/admin/blocked-ips", response_model=BlockedIPResponse)
 async def block_ip(
     data: BlockIPRequest,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(limited_db("admin")),
     _: bool = Depends(verify_admin)
 ):
     """IPアドレスをブロック"""
@@ -442,10 +727,59 @@ async def block_ip(
     return blocked_ip
 
 
+@app.post("/api/admin/blocked-ips/bulk", response_model=BulkBlockIPResponse)
+async def block_ips_bulk(
+    data: BulkBlockIPRequest,
+    db: AsyncSession = Depends(limited_db("admin")),
+    _: bool = Depends(verify_admin)
+):
+    """複数のIPアドレスをまとめてブロック
+    
+    ブロック済みのIPは無視する。reject_pendingがtrueの場合は、
+    対象IPからの承認待ち投稿も同じトランザクションで却下する。
+    """
+    ips = list(dict.fromkeys(ip.strip() for ip in data.ip_addresses if ip.strip()))
+    if not ips or len(ips) > 100:
+        raise HTTPException(status_code=400, detail="IPアドレスは1〜100件で指定してください")
+    
+    now = datetime.utcnow()
+    stmt = pg_insert(BlockedIP).values([
+        {"id": uuid.uuid4(), "ip_address": ip, "reason": data.reason, "blocked_at": now}
+        for ip in ips
+    ]).on_conflict_do_nothing(index_elements=[BlockedIP.ip_address]).returning(BlockedIP.ip_address)
+    result = await db.execute(stmt)
+    blocked = set(result.scalars().all())
+    
+    rejected = []
+    if data.reject_pending:
+        stmt = delete(Progression).where(
+            and_(Progression.ip_address.in_(ips), Progression.status == "pending")
+        ).returning(
+            Progression.id, Progression.original_id, Progression.ip_address
+        ).execution_options(synchronize_session=False)
+        result = await db.execute(stmt)
+        rejected = result.all()
+        rejections = Counter(ip for _, _, ip in rejected)
+        await ip_activity.record(db, {(ip, "rejections"): count for ip, count in rejections.items()})
+        await events.notify_many(db, "processed", [
+            {"id": progression_id, "action": "reject", "is_edit": original_id is not None}
+            for progression_id, original_id, _ in rejected
+        ])
+    await db.commit()
+    for progression_id, original_id, _ in rejected:
+        invalidate_processed(progression_id, "reject", original_id is not None)
+    
+    return {
+        "blocked": [ip for ip in ips if ip in blocked],
+        "already_blocked": [ip for ip in ips if ip not in blocked],
+        "rejected_count": len(rejected),
+    }
+
+
 @app.delete("/api/admin/blocked-ips/{ip_id}")
 async def unblock_ip(
     ip_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(limited_db("admin")),
     _: bool = Depends(verify_admin)
 ):
     """IPアドレスのブロックを解除"""
@@ -464,7 +798,7 @@ async def unblock_ip(
 
 @app.get("/api/admin/feedbacks", response_model=List[FeedbackResponse])
 async def get_feedbacks(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(limited_db("admin")),
     _: bool = Depends(verify_admin)
 ):
     """ご意見・ご感想一覧を取得"""
@@ -473,6 +807,75 @@ async def get_feedbacks(
     return result.scalars().all()
 
 
+@app.get("/api/admin/ip-activity", response_model=IpActivityResponse)
+async def get_ip_activity(
+    hours: int = Query(24, ge=1, le=ip_activity.RETENTION_DAYS * 24, description="集計期間(時間)"),
+    limit: int = Query(50, ge=1, le=200, description="取得件数"),
+    db: AsyncSession = Depends(limited_db("admin")),
+    _: bool = Depends(verify_admin)
+):
+    """直近の投稿数が多いIPアドレスを取得
+    
+    1時間単位のカウンターを合計するため、投稿・フィードバックの件数によらず
+    集計期間内のバケット数分の読み込みで済む。
+    """
+    return {"hours": hours, "items": await ip_activity.top_submitters(db, hours, limit)}
+
+
+@app.get("/api/admin/ip-activity/{ip_address}", response_model=IpActivityDetailResponse)
+async def get_ip_activity_detail(
+    ip_address: str,
+    limit: int = Query(20, ge=1, le=100, description="取得件数"),
+    db: AsyncSession = Depends(limited_db("admin")),
+    _: bool = Depends(verify_admin)
+):
+    """IPアドレスからの承認待ち投稿とフィードバックを取得"""
+    pending, feedbacks = await ip_activity.recent_submissions(db, ip_address, limit)
+    stmt = select(BlockedIP.id).where(BlockedIP.ip_address == ip_address)
+    result = await db.execute(stmt)
+    return {
+        "ip_address": ip_address,
+        "blocked": result.scalar_one_or_none() is not None,
+        "pending": [serializers.summary_item(row) for row in pending],
+        "feedbacks": feedbacks,
+    }
+
+
+@app.get("/api/admin/load")
+async def get_load(
+    _: bool = Depends(verify_admin)
+):
+    """ルート種別ごとの同時実行数・待ち行列長・シェッド数と閲覧数の未フラッシュ件数を取得(ワーカー単位)"""
+    return {"pid": os.getpid(), "route_classes": get_load_stats(), "view_counter": view_counter.stats()}
+
+
+@app.get("/api/admin/search-cache")
+async def get_search_cache_stats(
+    _: bool = Depends(verify_admin)
+):
+    """検索キャッシュのヒット・ミス・追い出し数を取得(ワーカー単位)"""
+    return {"pid": os.getpid(), **search_cache.stats()}
+
+
+@app.get("/api/admin/snapshot")
+async def get_snapshot_stats(
+    _: bool = Depends(verify_admin)
+):
+    """静的スナップショットの書き出し状況を取得(ワーカー単位)"""
+    return {"pid": os.getpid(), **snapshot_publisher.stats()}
+
+
+@app.post("/api/admin/snapshot")
+async def republish_snapshot(
+    _: bool = Depends(verify_admin)
+):
+    """静的スナップショットの全件書き出しを予約"""
+    if not snapshot_publisher.enabled:
+        raise HTTPException(status_code=400, detail="静的スナップショットは無効です(SNAPSHOT_DIR未設定)")
+    snapshot_publisher.schedule(full=True)
+    return {"message": "全件の書き出しを予約しました"}
+
+
 @app.get("/health")
 async def health_check():
     """ヘルスチェック"""
@@ -4,12 +4,16 @@
 - Progression: コード進行本体
 - Pattern: コード進行のパターン(複数登録可能)
 - Song: 使用楽曲情報
+- SongCatalog: 重複を除いた楽曲カタログ
 - BlockedIP: ブロックIPリスト
+- ProgressionView: 閲覧数カウンター
+- ChordNgramStat / ChordNgramDaily: コードn-gramの集計値
+- IpActivity: IPアドレス別の投稿数(1時間単位)
 """
 
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Text, DateTime, Integer, ForeignKey, CheckConstraint
+from sqlalchemy import Column, String, Text, Date, DateTime, Integer, SmallInteger, BigInteger, ForeignKey, CheckConstraint, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from database import Base
@@ -33,11 +37,12 @@ class Progression(Base):
     ip_address = Column(String(45))
     original_id = Column(UUID(as_uuid=True), ForeignKey("progressions.id", ondelete="SET NULL"), nullable=True)
 
-    patterns = relationship("Pattern", back_populates="progression", cascade="all, delete-orphan")
+    patterns = relationship("Pattern", back_populates="progression", cascade="all, delete-orphan", order_by="Pattern.sort_order")
     songs = relationship("Song", back_populates="progression", cascade="all, delete-orphan")
 
     __table_args__ = (
         CheckConstraint("status IN ('pending', 'approved', 'rejected')", name="check_status"),
+        Index("idx_progressions_ip_created", ip_address, created_at),
     )
 
 
@@ -73,9 +78,85 @@ class Song(Base):
     youtube_url = Column(Text)
     spotify_url = Column(Text)
     apple_music_url = Column(Text)
+    catalog_id = Column(UUID(as_uuid=True), ForeignKey("song_catalog.id"), nullable=True)  # 楽曲カタログ
 
     progression = relationship("Progression", back_populates="songs")
 
+    __table_args__ = (
+        Index("idx_songs_catalog_id", catalog_id),
+    )
+
+
+class SongCatalog(Base):
+    """楽曲カタログテーブル
+    
+    正規化した曲名・アーティスト名とURLの組(song_key)で重複を除いた楽曲。
+    曲名・アーティスト名はトライグラムインデックスで部分一致検索する。
+    """
+    __tablename__ = "song_catalog"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    song_key = Column(Text, nullable=False, unique=True)
+    canonical_name = Column(Text, nullable=False)
+    canonical_artist = Column(Text, nullable=False, default="")
+    youtube_url = Column(Text)
+    spotify_url = Column(Text)
+    apple_music_url = Column(Text)
+
+    __table_args__ = (
+        Index("idx_song_catalog_name_trgm", canonical_name,
+              postgresql_using="gin", postgresql_ops={"canonical_name": "gin_trgm_ops"}),
+        Index("idx_song_catalog_artist_trgm", canonical_artist,
+              postgresql_using="gin", postgresql_ops={"canonical_artist": "gin_trgm_ops"}),
+    )
+
+
+class ProgressionView(Base):
+    """閲覧数カウンターテーブル
+    
+    progressionsの行ロック競合を避けるため別テーブルで管理。
+    アプリ側で集計した閲覧数を定期的にまとめて加算する。
+    """
+    __tablename__ = "progression_views"
+
+    progression_id = Column(UUID(as_uuid=True), ForeignKey("progressions.id", ondelete="CASCADE"), primary_key=True)
+    view_count = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("idx_progression_views_view_count", view_count.desc()),
+    )
+
+
+class ChordNgramStat(Base):
+    """コードn-gram累計テーブル
+    
+    n-gram(例: n=4, "IV|V|IIIm|VIm")ごとに、それを含む承認済み進行の数を保持。
+    承認時に差分を加算する(analytics.py)。
+    """
+    __tablename__ = "chord_ngram_stats"
+
+    n = Column(SmallInteger, primary_key=True)
+    ngram = Column(Text, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("idx_chord_ngram_stats_n_count", n, count.desc()),
+    )
+
+
+class ChordNgramDaily(Base):
+    """コードn-gram日別テーブル
+    
+    承認日ごとのn-gram増減。直近の合計をトレンドとして使用。
+    """
+    __tablename__ = "chord_ngram_daily"
+
+    day = Column(Date, primary_key=True)
+    n = Column(SmallInteger, primary_key=True)
+    ngram = Column(Text, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+
 
 class BlockedIP(Base):
     """ブロックIPテーブル
@@ -101,3 +182,24 @@ class Feedback(Base):
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     ip_address = Column(String(45))
+
+    __table_args__ = (
+        Index("idx_feedbacks_ip_created", ip_address, created_at),
+    )
+
+
+class IpActivity(Base):
+    """IPアドレス別投稿数テーブル
+    
+    1時間単位のバケットに投稿・編集リクエスト・フィードバック・却下の件数を保持。
+    投稿と同じトランザクションで加算する(ip_activity.py)。
+    """
+    __tablename__ = "ip_activity"
+
+    hour = Column(DateTime, primary_key=True)
+    ip_address = Column(String(45), primary_key=True)
+    posts = Column(Integer, nullable=False, default=0)
+    edits = Column(Integer, nullable=False, default=0)
+    feedbacks = Column(Integer, nullable=False, default=0)
+    rejections = Column(Integer, nullable=False, default=0)
+    last_at = Column(DateTime)
@@ -0,0 +1,203 @@
+"""編集リクエストの構造差分
+
+元の投稿と編集リクエストを比較し、変更箇所だけを返す。
+
+- パターン: ラベルで対応付け、残りは並び順で対応付ける(ラベル変更とみなす)
+- コード: 16枠を1枠ずつ比較
+- 楽曲: 曲名・アーティスト名(大文字小文字・前後空白を無視)で対応付ける
+- タイトル・備考: 項目単位で比較
+
+計算結果は承認待ちIDごとにワーカー内でキャッシュし、承認/却下時に破棄する。
+"""
+
+import os
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+# 1パターンの枠数
+SLOT_COUNT = 16
+# 比較する楽曲の項目
+SONG_FIELDS = ("name", "artist", "youtube_url", "spotify_url", "apple_music_url")
+# キャッシュするエントリ数の上限
+MAX_CACHED_DIFFS = int(os.getenv("DIFF_CACHE_MAX_ENTRIES", "256"))
+
+
+def _field_changes(before: Any, after: Any, fields: Sequence[str]) -> List[dict]:
+    return [
+        {"field": field, "before": getattr(before, field), "after": getattr(after, field)}
+        for field in fields
+        if getattr(before, field) != getattr(after, field)
+    ]
+
+
+def _slot_changes(before: List[Optional[str]], after: List[Optional[str]]) -> List[dict]:
+    """16枠のコード配列を1枠ずつ比較(空文字はnullとして扱う)"""
+    length = max(SLOT_COUNT, len(before), len(after))
+    changes = []
+    for i in range(length):
+        b = before[i] if i < len(before) else None
+        a = after[i] if i < len(after) else None
+        if (b or None) != (a or None):
+            changes.append({"index": i, "before": b or None, "after": a or None})
+    return changes
+
+
+def _match_patterns(before: List[Any], after: List[Any]) -> Tuple[List[Tuple[Any, Any]], List[Any], List[Any]]:
+    """パターンを対応付ける
+
+    Returns:
+        tuple: (対応付いたペア, 削除されたパターン, 追加されたパターン)
+    """
+    pairs = []
+    unmatched_after = list(after)
+    by_label: Dict[str, List[Any]] = defaultdict(list)
+    for pattern in after:
+        by_label[pattern.label].append(pattern)
+
+    # 1. 同じラベル同士を出現順に対応付け
+    unmatched_before = []
+    for pattern in before:
+        candidates = by_label.get(pattern.label)
+        if candidates:
+            match = candidates.pop(0)
+            pairs.append((pattern, match))
+            unmatched_after.remove(match)
+        else:
+            unmatched_before.append(pattern)
+
+    # 2. 残りは同じ並び順同士を対応付け(ラベル変更)
+    by_order = {pattern.sort_order: pattern for pattern in unmatched_after}
+    removed = []
+    for pattern in unmatched_before:
+        match = by_order.pop(pattern.sort_order, None)
+        if match is not None:
+            pairs.append((pattern, match))
+            unmatched_after.remove(match)
+        else:
+            removed.append(pattern)
+    return pairs, removed, unmatched_after
+
+
+def diff_patterns(before: List[Any], after: List[Any]) -> List[dict]:
+    """パターンの差分(変更のないパターンは含めない)"""
+    before = sorted(before, key=lambda p: p.sort_order)
+    after = sorted(after, key=lambda p: p.sort_order)
+    pairs, removed, added = _match_patterns(before, after)
+
+    diffs = []
+    for old, new in pairs:
+        slots = _slot_changes(old.chords or [], new.chords or [])
+        label_changed = old.label != new.label
+        order_changed = old.sort_order != new.sort_order
+        if not (slots or label_changed or order_changed):
+            continue
+        diffs.append({
+            "status": "modified",
+            "label": new.label,
+            "sort_order": new.sort_order,
+            "before_label": old.label if label_changed else None,
+            "before_sort_order": old.sort_order if order_changed else None,
+            "chords": None,
+            "slots": slots,
+        })
+    for status, patterns in (("removed", removed), ("added", added)):
+        for pattern in patterns:
+            diffs.append({
+                "status": status,
+                "label": pattern.label,
+                "sort_order": pattern.sort_order,
+                "before_label": None,
+                "before_sort_order": None,
+                "chords": pattern.chords,
+                "slots": [],
+            })
+    diffs.sort(key=lambda d: (d["sort_order"], d["status"] != "removed"))
+    return diffs
+
+
+def _song_key(song: Any) -> Tuple[str, str]:
+    return ((song.name or "").strip().lower(), (song.artist or "").strip().lower())
+
+
+def diff_songs(before: List[Any], after: List[Any]) -> List[dict]:
+    """楽曲の差分(変更のない楽曲は含めない)"""
+    by_key: Dict[Tuple[str, str], List[Any]] = defaultdict(list)
+    for song in after:
+        by_key[_song_key(song)].append(song)
+
+    diffs = []
+    for song in before:
+        candidates = by_key.get(_song_key(song))
+        if not candidates:
+            diffs.append({"status": "removed", "name": song.name, "artist": song.artist, "fields": []})
+            continue
+        match = candidates.pop(0)
+        fields = _field_changes(song, match, SONG_FIELDS)
+        if fields:
+            diffs.append({"status": "modified", "name": match.name, "artist": match.artist, "fields": fields})
+    for songs in by_key.values():
+        for song in songs:
+            diffs.append({"status": "added", "name": song.name, "artist": song.artist, "fields": []})
+    return diffs
+
+
+def build_diff(original: Any, updated: Any) -> dict:
+    """元の投稿と編集リクエストの構造差分(DiffResponse相当のdict)
+
+    Args:
+        original: 元の投稿(patterns・songsを読み込み済み)
+        updated: 編集リクエスト(patterns・songsを読み込み済み)
+    """
+    return {
+        "id": updated.id,
+        "original_id": original.id,
+        "updated": None,
+        "fields": _field_changes(original, updated, ("title", "remarks")),
+        "patterns": diff_patterns(original.patterns, updated.patterns),
+        "songs": diff_songs(original.songs, updated.songs),
+    }
+
+
+class DiffCache:
+    """承認待ちIDごとの差分キャッシュ(LRU)
+
+    破棄のたびにgenerationを進め、クエリ中に破棄を跨いだ差分は登録しない。
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_DIFFS):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[UUID, Any]" = OrderedDict()
+        self.generation = 0
+
+    def get(self, progression_id: UUID) -> Optional[Any]:
+        entry = self._entries.get(progression_id)
+        if entry is not None:
+            self._entries.move_to_end(progression_id)
+        return entry
+
+    def put(self, progression_id: UUID, diff: Any, generation: int) -> None:
+        """差分を登録
+
+        Args:
+            progression_id: 承認待ちの投稿ID
+            diff: 差分
+            generation: クエリ開始時点のself.generation(破棄を跨いだ結果は登録しない)
+        """
+        if generation != self.generation:
+            return
+        self._entries[progression_id] = diff
+        self._entries.move_to_end(progression_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, progression_id: UUID) -> None:
+        self._entries.pop(progression_id, None)
+        self.generation += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.generation += 1
+
+
+diff_cache = DiffCache()
@@ -95,6 +95,26 @@ class AdminAction(BaseModel):
     action: str  # "approve" or "reject"
 
 
+class PendingSummaryResponse(BaseModel):
+    """承認待ち一覧用の軽量サマリー(詳細はdiff APIで取得)"""
+    id: UUID
+    title: str
+    chords_preview: Optional[str]  # normalized_chordsの先頭部分
+    pattern_count: int
+    song_count: int
+    original_id: Optional[UUID] = None
+    ip_address: Optional[str] = None
+    created_at: datetime
+
+
+class PendingPageResponse(BaseModel):
+    items: List[PendingSummaryResponse]
+    total: int  # 承認待ち総数
+    edit_count: int  # うち編集リクエスト数
+    limit: int
+    offset: int
+
+
 class BlockIPRequest(BaseModel):
     ip_address: str
     reason: Optional[str] = None
@@ -110,9 +130,33 @@ class BlockedIPResponse(BaseModel):
         from_attributes = True
 
 
-class DiffResponse(BaseModel):
-    original: Optional[ProgressionResponse]
-    updated: ProgressionResponse
+class BulkBlockIPRequest(BaseModel):
+    ip_addresses: List[str]
+    reason: Optional[str] = None
+    reject_pending: bool = False  # 承認待ちの投稿もまとめて却下する
+
+
+class BulkBlockIPResponse(BaseModel):
+    blocked: List[str]  # 新たにブロックしたIP
+    already_blocked: List[str]
+    rejected_count: int  # 却下した承認待ち投稿の数
+
+
+class IpActivityItem(BaseModel):
+    ip_address: str
+    total: int  # 投稿・編集リクエスト・フィードバックの合計
+    posts: int
+    edits: int
+    feedbacks: int
+    rejections: int
+    pending: int  # 現在の承認待ち件数
+    last_at: Optional[datetime]
+    blocked: bool
+
+
+class IpActivityResponse(BaseModel):
+    hours: int
+    items: List[IpActivityItem]
 
 
 # Feedback schemas
@@ -130,6 +174,13 @@ class FeedbackResponse(BaseModel):
         from_attributes = True
 
 
+class IpActivityDetailResponse(BaseModel):
+    ip_address: str
+    blocked: bool
+    pending: List[PendingSummaryResponse]  # 承認待ちの投稿(新しい順)
+    feedbacks: List[FeedbackResponse]  # フィードバック(新しい順)
+
+
 class BlockedIPResponse(BaseModel):
     id: UUID
     ip_address: str
@@ -140,13 +191,59 @@ class BlockedIPResponse(BaseModel):
         from_attributes = True
 
 
+# Stats schemas(コード統計)
+class NgramCount(BaseModel):
+    ngram: str  # 例: "IV|V|IIIm|VIm"
+    count: int
+
+
+class ChordStatsResponse(BaseModel):
+    n: int
+    days: int
+    top: List[NgramCount]  # 累計の上位
+    trending: List[NgramCount]  # 直近days日間の上位
+
+
 # Search schemas
 class SearchQuery(BaseModel):
     query: Optional[str] = None
     chord_query: Optional[str] = None  # 例: "IV|V" や "IIIm|VIm"
 
 
-# Diff view for admin
+# Diff view for admin(編集リクエストの構造差分、変更箇所のみ)
+class FieldChange(BaseModel):
+    field: str  # "title" / "remarks" / 楽曲のURL等
+    before: Optional[str]
+    after: Optional[str]
+
+
+class ChordSlotChange(BaseModel):
+    index: int  # 0〜15の枠番号
+    before: Optional[str]
+    after: Optional[str]
+
+
+class PatternDiff(BaseModel):
+    status: str  # "added" / "removed" / "modified"
+    label: str
+    sort_order: int
+    before_label: Optional[str] = None  # ラベル変更時のみ
+    before_sort_order: Optional[int] = None  # 並び順変更時のみ
+    chords: Optional[List[Optional[str]]] = None  # added/removedの場合のみ全枠
+    slots: List[ChordSlotChange] = []  # modifiedの場合の変更枠
+
+
+class SongDiff(BaseModel):
+    status: str  # "added" / "removed" / "modified"
+    name: str
+    artist: Optional[str] = None
+    fields: List[FieldChange] = []  # modifiedの場合の変更項目
+
+
 class DiffResponse(BaseModel):
-    original: Optional[ProgressionResponse]
-    updated: ProgressionResponse
+    id: UUID
+    original_id: Optional[UUID]
+    updated: Optional[ProgressionResponse] = None  # 新規投稿の場合のみ(比較対象がないため全体)
+    fields: List[FieldChange] = []
+    patterns: List[PatternDiff] = []
+    songs: List[SongDiff] = []
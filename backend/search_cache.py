@@ -0,0 +1,129 @@
+"""検索結果キャッシュ
+
+アクセスが集中する定番進行(王道進行・カノン進行など)の検索に対し、
+ヒットしたProgressionのIDリストをワーカー内メモリに保持する。
+
+- キー: 正規化済みの検索条件(|Ⅳ||Ⅴ| と IV-V は同じエントリ)
+- 容量: 保持するIDの総数で制限(サイズ考慮のLRU)
+- 有効期限: TTL経過で破棄
+- 無効化: 承認済みカタログが変わった時点で全エントリを破棄
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from chord_utils import normalize_search_query
+from song_catalog import canonicalize
+
+# 保持するIDの総数の上限
+MAX_IDS = int(os.getenv("SEARCH_CACHE_MAX_IDS", "200000"))
+# エントリ数の上限
+MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024"))
+# エントリの有効期限(秒)
+TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "300"))
+
+CacheKey = Tuple[str, str, str, str]
+
+
+def make_search_key(
+    query: Optional[str],
+    chord_query: Optional[str],
+    song: Optional[str] = None,
+    artist: Optional[str] = None
+) -> CacheKey:
+    """検索条件からキャッシュキーを生成
+
+    検索はILIKE(大文字小文字を区別しない)のため、キーも小文字化する。
+    曲名・アーティスト名は楽曲カタログと同じ正規化を行う。
+    """
+    text_key = (query or "").strip().lower()
+    chord_key = normalize_search_query(chord_query).lower()
+    return (text_key, chord_key, canonicalize(song), canonicalize(artist))
+
+
+class SearchCache:
+    """IDリストを保持するサイズ考慮のLRU+TTLキャッシュ"""
+
+    def __init__(self, max_ids: int = MAX_IDS, max_entries: int = MAX_ENTRIES, ttl: float = TTL_SECONDS):
+        self.max_ids = max_ids
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key → (登録時刻, IDリスト)
+        self._entries: "OrderedDict[CacheKey, Tuple[float, List[UUID]]]" = OrderedDict()
+        self._size = 0
+        # 無効化のたびに進む世代番号(検索中に無効化された結果を登録しないため)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _weight(ids: List[UUID]) -> int:
+        return len(ids) + 1
+
+    def get(self, key: CacheKey) -> Optional[List[UUID]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        stored_at, ids = entry
+        if time.monotonic() - stored_at > self.ttl:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return ids
+
+    def put(self, key: CacheKey, ids: List[UUID], generation: int) -> None:
+        """検索結果を登録
+
+        Args:
+            key: キャッシュキー
+            ids: 検索結果のIDリスト
+            generation: 検索開始時点のself.generation(無効化を跨いだ結果は登録しない)
+        """
+        if generation != self.generation or self._weight(ids) > self.max_ids:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic(), ids)
+        self._size += self._weight(ids)
+        while self._size > self.max_ids or len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: CacheKey) -> None:
+        _, ids = self._entries.pop(key)
+        self._size -= self._weight(ids)
+
+    def invalidate(self) -> None:
+        """全エントリを破棄(承認済みカタログ変更時)"""
+        self._entries.clear()
+        self._size = 0
+        self.generation += 1
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "ids": self._size - len(self._entries),
+            "max_ids": self.max_ids,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+search_cache = SearchCache()
@@ -0,0 +1,251 @@
+"""高速JSONシリアライズ
+
+ホットなGETエンドポイント向けに、ORMオブジェクトとresponse_modelの
+バリデーションを経由せず、行タプルから直接JSONを生成する。
+出力はFastAPIの既定シリアライズ(response_model + JSONResponse)と
+バイト単位で一致するよう、キー順・日時表記・区切り文字を揃えている。
+
+環境変数FAST_JSON=1で有効化(デフォルト: 無効)。
+orjsonがインストールされていればorjsonを、なければ標準のjsonを使用する。
+"""
+
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from uuid import UUID
+
+from fastapi import Response
+from sqlalchemy import select, func, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from chord_utils import render_patterns
+from models import Progression, Pattern, Song
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjsonは任意依存
+    orjson = None
+
+# 高速シリアライズを有効にするか(オプトイン)
+FAST_JSON_ENABLED = os.getenv("FAST_JSON", "0").lower() in ("1", "true", "yes")
+
+# 一覧用カラム(ProgressionListResponseのフィールド順)
+LIST_COLUMNS = (
+    Progression.id,
+    Progression.title,
+    Progression.remarks,
+    Progression.status,
+    Progression.created_at,
+)
+
+# 詳細用カラム(ProgressionResponseのフィールド順)
+DETAIL_COLUMNS = (
+    Progression.title,
+    Progression.remarks,
+    Progression.id,
+    Progression.status,
+    Progression.normalized_chords,
+    Progression.created_at,
+    Progression.updated_at,
+    Progression.original_id,
+    Progression.ip_address,
+)
+
+# 承認待ちサマリーのプレビュー文字数
+CHORDS_PREVIEW_LENGTH = 200
+
+# 承認待ちサマリー用カラム(PendingSummaryResponseのフィールド順)
+SUMMARY_COLUMNS = (
+    Progression.id,
+    Progression.title,
+    func.left(Progression.normalized_chords, CHORDS_PREVIEW_LENGTH).label("chords_preview"),
+    select(func.count()).where(
+        Pattern.progression_id == Progression.id
+    ).correlate(Progression).scalar_subquery().label("pattern_count"),
+    select(func.count()).where(
+        Song.progression_id == Progression.id
+    ).correlate(Progression).scalar_subquery().label("song_count"),
+    Progression.original_id,
+    Progression.ip_address,
+    Progression.created_at,
+)
+
+
+def uuid_in(column, ids: Sequence[UUID]):
+    """column IN ids を配列パラメーター1つ(= ANY($1))で表現
+
+    IDが数千件になってもバインドパラメーター数の上限に達しない。
+    """
+    return column == any_(bindparam(None, list(ids), type_=ARRAY(PG_UUID(as_uuid=True))))
+
+
+def _default(obj: Any) -> str:
+    """標準json用のフォールバック変換(UUID・datetime)"""
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """FastAPIのJSONResponseと同一バイト列になるようにエンコード
+
+    Args:
+        content: dict/listなどのJSON化可能なオブジェクト
+
+    Returns:
+        bytes: UTF-8エンコード済みJSON
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+        default=_default,
+    ).encode("utf-8")
+
+
+def json_response(content: Any) -> Response:
+    """エンコード済みJSONをそのまま返すResponseを生成"""
+    return Response(content=dumps(content), media_type="application/json")
+
+
+async def load_patterns(db: AsyncSession, progression_ids: Sequence[UUID]) -> Dict[UUID, List[dict]]:
+    """複数Progressionのパターンを1クエリで取得
+
+    Returns:
+        dict: progression_id → PatternResponse相当のdictリスト
+    """
+    patterns: Dict[UUID, List[dict]] = defaultdict(list)
+    if not progression_ids:
+        return patterns
+    stmt = select(
+        Pattern.progression_id, Pattern.label, Pattern.chords, Pattern.id, Pattern.sort_order
+    ).where(
+        uuid_in(Pattern.progression_id, progression_ids)
+    ).order_by(Pattern.progression_id, Pattern.sort_order)
+    result = await db.execute(stmt)
+    for progression_id, label, chords, pattern_id, sort_order in result.all():
+        patterns[progression_id].append({
+            "label": label,
+            "chords": chords,
+            "id": pattern_id,
+            "sort_order": sort_order,
+        })
+    return patterns
+
+
+async def load_songs(db: AsyncSession, progression_ids: Sequence[UUID]) -> Dict[UUID, List[dict]]:
+    """複数Progressionの楽曲を1クエリで取得
+
+    Returns:
+        dict: progression_id → SongResponse相当のdictリスト
+    """
+    songs: Dict[UUID, List[dict]] = defaultdict(list)
+    if not progression_ids:
+        return songs
+    stmt = select(
+        Song.progression_id, Song.name, Song.artist, Song.youtube_url,
+        Song.spotify_url, Song.apple_music_url, Song.id
+    ).where(uuid_in(Song.progression_id, progression_ids))
+    result = await db.execute(stmt)
+    for progression_id, name, artist, youtube_url, spotify_url, apple_music_url, song_id in result.all():
+        songs[progression_id].append({
+            "name": name,
+            "artist": artist,
+            "youtube_url": youtube_url,
+            "spotify_url": spotify_url,
+            "apple_music_url": apple_music_url,
+            "id": song_id,
+        })
+    return songs
+
+
+def list_item(row: Sequence[Any], patterns: List[dict]) -> dict:
+    """LIST_COLUMNSの行タプルからProgressionListResponse相当のdictを生成"""
+    progression_id, title, remarks, status, created_at = row
+    return {
+        "id": progression_id,
+        "title": title,
+        "remarks": remarks,
+        "status": status,
+        "created_at": created_at,
+        "patterns": patterns,
+    }
+
+
+def detail_item(row: Sequence[Any], patterns: List[dict], songs: List[dict]) -> dict:
+    """DETAIL_COLUMNSの行タプルからProgressionResponse相当のdictを生成"""
+    (title, remarks, progression_id, status, normalized_chords,
+     created_at, updated_at, original_id, ip_address) = row
+    return {
+        "title": title,
+        "remarks": remarks,
+        "id": progression_id,
+        "status": status,
+        "normalized_chords": normalized_chords,
+        "created_at": created_at,
+        "updated_at": updated_at,
+        "patterns": patterns,
+        "songs": songs,
+        "original_id": original_id,
+        "ip_address": ip_address,
+    }
+
+
+def summary_item(row: Sequence[Any]) -> dict:
+    """SUMMARY_COLUMNSの行タプルからPendingSummaryResponse相当のdictを生成"""
+    (progression_id, title, chords_preview, pattern_count, song_count,
+     original_id, ip_address, created_at) = row
+    return {
+        "id": progression_id,
+        "title": title,
+        "chords_preview": chords_preview,
+        "pattern_count": pattern_count,
+        "song_count": song_count,
+        "original_id": original_id,
+        "ip_address": ip_address,
+        "created_at": created_at,
+    }
+
+
+async def build_list(db: AsyncSession, rows: Iterable[Sequence[Any]], key: Optional[str] = None) -> List[dict]:
+    """LIST_COLUMNSの行タプル群から一覧のdictリストを構築(パターンは1クエリ)
+
+    keyを指定した場合、各パターンに音名表記(rendered_chords)を追加する。
+    """
+    rows = list(rows)
+    patterns = await load_patterns(db, [row[0] for row in rows])
+    if key:
+        render_patterns(chain.from_iterable(patterns.values()), key)
+    return [list_item(row, patterns.get(row[0], [])) for row in rows]
+
+
+async def build_details(db: AsyncSession, rows: Iterable[Sequence[Any]], key: Optional[str] = None) -> List[dict]:
+    """DETAIL_COLUMNSの行タプル群から詳細のdictリストを構築(パターン・楽曲は各1クエリ)"""
+    rows = list(rows)
+    ids = [row[2] for row in rows]
+    patterns = await load_patterns(db, ids)
+    if key:
+        render_patterns(chain.from_iterable(patterns.values()), key)
+    songs = await load_songs(db, ids)
+    return [detail_item(row, patterns.get(row[2], []), songs.get(row[2], [])) for row in rows]
+
+
+async def render_list(db: AsyncSession, rows: Iterable[Sequence[Any]], key: Optional[str] = None) -> Response:
+    """一覧レスポンスを行タプルから構築"""
+    return json_response(await build_list(db, rows, key))
+
+
+async def render_detail(db: AsyncSession, row: Sequence[Any], key: Optional[str] = None) -> Response:
+    """単一の詳細レスポンスを行タプルから構築"""
+    items = await build_details(db, [row], key)
+    return json_response(items[0])
@@ -0,0 +1,344 @@
+"""公開カタログの静的スナップショット
+
+公開APIのうち承認時にしか内容が変わらない応答を、nginxが直接配信できる
+ファイルとしてSNAPSHOT_DIRへ書き出す。uvicornは検索・投稿・管理APIだけを処理する。
+
+書き出すファイル(SNAPSHOT_DIRからの相対パス = 配信URL + .json):
+- api/progressions.json: 承認済み一覧(GET /api/progressions の検索条件なしと同一)
+- api/progressions/pages/{n}.json: 一覧のページ({"items", "total", "page", "pages", "page_size"})
+- api/progressions/{id}.json: 詳細(GET /api/progressions/{id} と同一)
+- api/chord-options.json: コード入力用のオプション一覧
+
+各ファイルは一時ファイルへ書いてからrenameで置き換え(配信中に壊れた内容が見えない)、
+gzip(.gz)と、brotliがインストールされていればbrotli(.br)の圧縮済みファイルも置く。
+内容が変わらないファイルは書き換えない。
+
+承認のたびにprocess_pendingからscheduleが呼ばれ、SNAPSHOT_DEBOUNCE_SECONDSの間に
+まとまった承認を1回の書き出しで反映する。複数ワーカーの書き出しはアドバイザリーロックで
+直列化し、後から書き出したワーカーが必ず新しい状態を書く。
+
+環境変数SNAPSHOT_DIRが未設定の場合は無効。全件を書き直すには:
+    python snapshot.py publish
+"""
+
+import argparse
+import asyncio
+import gzip
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, Iterable, List, Optional, Set
+from uuid import UUID
+
+from sqlalchemy import select, func, and_
+from sqlalchemy.exc import SQLAlchemyError
+
+import serializers
+from chord_utils import get_chord_options
+from database import AsyncSessionLocal
+from models import Progression
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotliは任意依存
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 書き出し先(未設定なら無効)
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "")
+# 承認から書き出しまでの待機時間(秒)
+DEBOUNCE_SECONDS = float(os.getenv("SNAPSHOT_DEBOUNCE_SECONDS", "2"))
+# 一覧ページあたりの件数
+PAGE_SIZE = int(os.getenv("SNAPSHOT_PAGE_SIZE", "50"))
+# 書き出しに失敗した場合の再試行間隔(秒)
+RETRY_SECONDS = 30.0
+# 詳細を1度に読み込む件数
+DETAIL_BATCH_SIZE = 500
+# 書き出しを直列化するアドバイザリーロックのキー
+ADVISORY_LOCK_KEY = 0x43505353  # "CPSS"
+
+LIST_PATH = "api/progressions.json"
+PAGES_DIR = "api/progressions/pages"
+DETAIL_DIR = "api/progressions"
+CHORD_OPTIONS_PATH = "api/chord-options.json"
+
+COMPRESSED_SUFFIXES = (".gz", ".br")
+
+
+def _compressed(data: bytes) -> Dict[str, bytes]:
+    """配信用の圧縮済みバリアント(拡張子 → 内容)"""
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=11)
+    return variants
+
+
+def _replace(path: str, data: bytes) -> None:
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstempは0600で作成するため、nginxから読めるようにする
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_file(path: str, data: bytes) -> bool:
+    """圧縮済みバリアントと合わせてアトミックに書き出す
+
+    Returns:
+        bool: 書き換えた場合True(内容が同じなら何もしない)
+    """
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 圧縮済みを先に置き、元ファイルの置き換えを最後に行う
+    for suffix, payload in _compressed(data).items():
+        _replace(path + suffix, payload)
+    _replace(path, data)
+    return True
+
+
+def remove_file(path: str) -> bool:
+    """元ファイルと圧縮済みバリアントを削除(元ファイルから消してtry_filesを外す)"""
+    removed = False
+    for suffix in ("",) + COMPRESSED_SUFFIXES:
+        try:
+            os.unlink(path + suffix)
+            removed = True
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def _write_all(files: Dict[str, bytes]) -> int:
+    return sum(1 for path, data in files.items() if write_file(path, data))
+
+
+def _remove_all(paths: Iterable[str]) -> int:
+    return sum(1 for path in paths if remove_file(path))
+
+
+def _listed_json(directory: str) -> Set[str]:
+    """ディレクトリ直下の.jsonファイル名(拡張子なし)"""
+    try:
+        return {name[:-5] for name in os.listdir(directory) if name.endswith(".json")}
+    except FileNotFoundError:
+        return set()
+
+
+def _listed_ids(directory: str) -> Set[UUID]:
+    """詳細ディレクトリに書き出し済みの投稿ID"""
+    ids = set()
+    for name in _listed_json(directory):
+        try:
+            ids.add(UUID(name))
+        except ValueError:
+            continue
+    return ids
+
+
+class SnapshotPublisher:
+    """承認済みカタログを静的ファイルへ書き出す(デバウンス付き)"""
+
+    def __init__(self, root: str = SNAPSHOT_DIR, debounce: float = DEBOUNCE_SECONDS, page_size: int = PAGE_SIZE):
+        self.root = root
+        self.debounce = debounce
+        self.page_size = page_size
+        self._changed: Set[UUID] = set()
+        self._removed: Set[UUID] = set()
+        self._full = False
+        self._task: Optional[asyncio.Task] = None
+        self.publishes = 0
+        self.failures = 0
+        self.files_written = 0
+        self.files_removed = 0
+        self.last_published_at: Optional[float] = None
+        self.last_duration_ms: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    def _path(self, relative: str) -> str:
+        return os.path.join(self.root, relative)
+
+    def _detail_path(self, progression_id: UUID) -> str:
+        return self._path(f"{DETAIL_DIR}/{progression_id}.json")
+
+    def schedule(self, changed: Iterable[UUID] = (), removed: Iterable[UUID] = (), full: bool = False) -> None:
+        """書き出しを予約(デバウンス後にまとめて実行)
+
+        Args:
+            changed: 承認された(詳細を書き直す)投稿のID
+            removed: 公開されなくなった(詳細を削除する)投稿のID
+            full: 全投稿の詳細を書き直す
+        """
+        if not self.enabled:
+            return
+        self._changed.update(changed)
+        self._removed.update(removed)
+        self._full = self._full or full
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _has_pending(self) -> bool:
+        return bool(self._changed or self._removed or self._full)
+
+    async def _publish_pending(self) -> bool:
+        changed, self._changed = self._changed, set()
+        removed, self._removed = self._removed, set()
+        full, self._full = self._full, False
+        try:
+            await self.publish(changed, removed, full)
+            return True
+        except asyncio.CancelledError:
+            # 停止時に中断された分はstopで書き出す
+            self._restore(changed, removed, full)
+            raise
+        except (OSError, SQLAlchemyError) as e:
+            logger.warning("スナップショットの書き出しに失敗しました: %s", e)
+            self.failures += 1
+            self._restore(changed, removed, full)
+            return False
+
+    def _restore(self, changed: Set[UUID], removed: Set[UUID], full: bool) -> None:
+        self._changed |= changed
+        self._removed |= removed
+        self._full = self._full or full
+
+    async def _run(self) -> None:
+        delay = self.debounce
+        while True:
+            await asyncio.sleep(delay)
+            if not self._has_pending():
+                return
+            delay = self.debounce if await self._publish_pending() else RETRY_SECONDS
+
+    async def publish(self, changed: Iterable[UUID] = (), removed: Iterable[UUID] = (), full: bool = False) -> None:
+        """一覧・ページ・詳細・コードオプションを書き出す"""
+        started = time.perf_counter()
+        changed = set(changed)
+        removed = set(removed) - changed
+        async with AsyncSessionLocal() as db:
+            # トランザクション終了まで他ワーカーの書き出しを待たせる
+            await db.execute(select(func.pg_advisory_xact_lock(ADVISORY_LOCK_KEY)))
+
+            stmt = select(*serializers.LIST_COLUMNS).where(
+                Progression.status == "approved"
+            ).order_by(Progression.created_at.desc())
+            result = await db.execute(stmt)
+            items = await serializers.build_list(db, result.all())
+            await self._write_list(items)
+
+            approved_ids = {item["id"] for item in items}
+            if full:
+                changed = approved_ids
+                removed |= _listed_ids(self._path(DETAIL_DIR)) - approved_ids
+            # 承認済みでなくなったものは詳細を削除
+            removed |= changed - approved_ids
+            changed &= approved_ids
+
+            ids = list(changed)
+            for i in range(0, len(ids), DETAIL_BATCH_SIZE):
+                batch = ids[i:i + DETAIL_BATCH_SIZE]
+                stmt = select(*serializers.DETAIL_COLUMNS).where(
+                    and_(serializers.uuid_in(Progression.id, batch), Progression.status == "approved")
+                )
+                result = await db.execute(stmt)
+                details = await serializers.build_details(db, result.all())
+                self.files_written += await asyncio.to_thread(_write_all, {
+                    self._detail_path(detail["id"]): serializers.dumps(detail) for detail in details
+                })
+            self.files_removed += await asyncio.to_thread(
+                _remove_all, [self._detail_path(progression_id) for progression_id in removed]
+            )
+
+            self.files_written += await asyncio.to_thread(_write_all, {
+                self._path(CHORD_OPTIONS_PATH): serializers.dumps(get_chord_options()),
+            })
+
+        self.publishes += 1
+        self.last_published_at = time.time()
+        self.last_duration_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    async def _write_list(self, items: List[dict]) -> None:
+        """一覧全体とページを書き出し、余ったページを削除"""
+        total = len(items)
+        pages = max(1, -(-total // self.page_size))
+        files = {self._path(LIST_PATH): serializers.dumps(items)}
+        for page in range(1, pages + 1):
+            start = (page - 1) * self.page_size
+            files[self._path(f"{PAGES_DIR}/{page}.json")] = serializers.dumps({
+                "items": items[start:start + self.page_size],
+                "total": total,
+                "page": page,
+                "pages": pages,
+                "page_size": self.page_size,
+            })
+        stale = [
+            self._path(f"{PAGES_DIR}/{name}.json")
+            for name in _listed_json(self._path(PAGES_DIR))
+            if not name.isdigit() or not 1 <= int(name) <= pages
+        ]
+        self.files_written += await asyncio.to_thread(_write_all, files)
+        self.files_removed += await asyncio.to_thread(_remove_all, stale)
+
+    def start(self) -> None:
+        """スナップショットがまだなければ全件の書き出しを予約"""
+        if self.enabled and not os.path.exists(self._path(LIST_PATH)):
+            self.schedule(full=True)
+
+    async def stop(self) -> None:
+        """待機中の書き出しを止め、予約分があれば書き出す"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._has_pending():
+            await self._publish_pending()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pending_changed": len(self._changed),
+            "pending_removed": len(self._removed),
+            "pending_full": self._full,
+            "publishes": self.publishes,
+            "failures": self.failures,
+            "files_written": self.files_written,
+            "files_removed": self.files_removed,
+            "last_published_at": self.last_published_at,
+            "last_duration_ms": self.last_duration_ms,
+            "brotli": brotli is not None,
+        }
+
+
+snapshot_publisher = SnapshotPublisher()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="静的スナップショットの管理")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("publish", help="全件を書き出す")
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        if not snapshot_publisher.enabled:
+            raise SystemExit("SNAPSHOT_DIRが設定されていません")
+        asyncio.run(snapshot_publisher.publish(full=True))
+        print(f"{snapshot_publisher.files_written}件を書き出し、{snapshot_publisher.files_removed}件を削除しました")
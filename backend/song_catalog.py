@@ -0,0 +1,198 @@
+"""楽曲カタログ
+
+進行ごとに重複して登録される楽曲を、正規化した曲名・アーティスト名と
+URLをキーに共有カタログ(song_catalog)へ集約する。
+songsテーブルは進行とカタログを結ぶ行となり、投稿時の表記もそのまま保持する。
+
+曲名・アーティスト名はpg_trgmのGINインデックスで部分一致検索でき、
+「このアーティストの曲で使われている進行」をインデックス経由の結合で引ける。
+
+既存のsongsをカタログへ紐付けるには:
+    python song_catalog.py backfill
+"""
+
+import argparse
+import asyncio
+import re
+import unicodedata
+import uuid
+from typing import List, Optional
+
+from sqlalchemy import select, update, exists, and_, text, bindparam, Text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from models import Progression, Song, SongCatalog
+
+# バックフィル時に1度に処理する行数
+BACKFILL_BATCH_SIZE = 1000
+
+# カタログのUPSERTと楽曲の挿入を1文で行う
+# (同じキーの既存エントリがあればそのIDに紐付ける)
+INSERT_SONGS_SQL = text("""
+    WITH catalog AS (
+        INSERT INTO song_catalog (id, song_key, canonical_name, canonical_artist,
+                                  youtube_url, spotify_url, apple_music_url)
+        SELECT * FROM unnest(:c_ids, :c_keys, :c_names, :c_artists,
+                             :c_youtube_urls, :c_spotify_urls, :c_apple_music_urls)
+        ON CONFLICT (song_key) DO UPDATE SET song_key = EXCLUDED.song_key
+        RETURNING id, song_key
+    )
+    INSERT INTO songs (id, progression_id, name, artist, youtube_url, spotify_url,
+                       apple_music_url, catalog_id)
+    SELECT s.id, s.progression_id, s.name, s.artist, s.youtube_url, s.spotify_url,
+           s.apple_music_url, catalog.id
+    FROM unnest(:ids, :progression_ids, :names, :artists, :youtube_urls,
+                :spotify_urls, :apple_music_urls, :keys)
+         AS s(id, progression_id, name, artist, youtube_url, spotify_url, apple_music_url, song_key)
+    JOIN catalog ON catalog.song_key = s.song_key
+""").bindparams(
+    *[bindparam(name, type_=ARRAY(PG_UUID(as_uuid=True))) for name in ("c_ids", "ids", "progression_ids")],
+    *[bindparam(name, type_=ARRAY(Text)) for name in (
+        "c_keys", "c_names", "c_artists", "c_youtube_urls", "c_spotify_urls", "c_apple_music_urls",
+        "names", "artists", "youtube_urls", "spotify_urls", "apple_music_urls", "keys",
+    )],
+)
+
+UPSERT_CATALOG_SQL = text("""
+    INSERT INTO song_catalog (id, song_key, canonical_name, canonical_artist,
+                              youtube_url, spotify_url, apple_music_url)
+    VALUES (:id, :song_key, :canonical_name, :canonical_artist,
+            :youtube_url, :spotify_url, :apple_music_url)
+    ON CONFLICT (song_key) DO UPDATE SET song_key = EXCLUDED.song_key
+    RETURNING id
+""")
+
+# 既存DB向けのスキーマ追加(create_allは既存テーブルへの列追加を行わないため)
+MIGRATION_SQL = (
+    "ALTER TABLE songs ADD COLUMN IF NOT EXISTS catalog_id UUID REFERENCES song_catalog(id)",
+    "CREATE INDEX IF NOT EXISTS idx_songs_catalog_id ON songs(catalog_id)",
+)
+
+
+def canonicalize(value: Optional[str]) -> str:
+    """曲名・アーティスト名の正規化(全角半角統一・小文字化・空白の整理)"""
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKC", value).lower()
+    return re.sub(r"\s+", " ", value).strip()
+
+
+def _url(value: Optional[str]) -> Optional[str]:
+    value = (value or "").strip()
+    return value or None
+
+
+def song_key(song: dict) -> str:
+    """カタログのキー(正規化した曲名・アーティスト名とURLの組)"""
+    return "\x1f".join([
+        canonicalize(song.get("name")),
+        canonicalize(song.get("artist")),
+        _url(song.get("youtube_url")) or "",
+        _url(song.get("spotify_url")) or "",
+        _url(song.get("apple_music_url")) or "",
+    ])
+
+
+async def insert_songs(db: AsyncSession, song_rows: List[dict]) -> None:
+    """楽曲をカタログに紐付けて挿入(カタログのUPSERTと合わせて1文)
+
+    Args:
+        db: データベースセッション
+        song_rows: songsテーブルの行(id, progression_id, name, ...)
+    """
+    keys = [song_key(row) for row in song_rows]
+    # 同じ文の中で同一キーを2回UPSERTできないため、カタログ側は重複を除く
+    catalog = {}
+    for row, key in zip(song_rows, keys):
+        catalog.setdefault(key, catalog_row(row))
+    catalog_rows = list(catalog.values())
+
+    await db.execute(INSERT_SONGS_SQL, {
+        "c_ids": [uuid.uuid4() for _ in catalog_rows],
+        "c_keys": [row["song_key"] for row in catalog_rows],
+        "c_names": [row["canonical_name"] for row in catalog_rows],
+        "c_artists": [row["canonical_artist"] for row in catalog_rows],
+        "c_youtube_urls": [row["youtube_url"] for row in catalog_rows],
+        "c_spotify_urls": [row["spotify_url"] for row in catalog_rows],
+        "c_apple_music_urls": [row["apple_music_url"] for row in catalog_rows],
+        "ids": [row["id"] for row in song_rows],
+        "progression_ids": [row["progression_id"] for row in song_rows],
+        "names": [row["name"] for row in song_rows],
+        "artists": [row["artist"] for row in song_rows],
+        "youtube_urls": [row["youtube_url"] for row in song_rows],
+        "spotify_urls": [row["spotify_url"] for row in song_rows],
+        "apple_music_urls": [row["apple_music_url"] for row in song_rows],
+        "keys": keys,
+    })
+
+
+def song_filter(song: Optional[str] = None, artist: Optional[str] = None):
+    """曲名・アーティスト名で進行を絞り込む条件
+
+    カタログのトライグラムインデックスで候補を引き、songs.catalog_idで結合する。
+    """
+    conditions = [Song.progression_id == Progression.id, Song.catalog_id == SongCatalog.id]
+    if song:
+        conditions.append(SongCatalog.canonical_name.ilike(f"%{canonicalize(song)}%"))
+    if artist:
+        conditions.append(SongCatalog.canonical_artist.ilike(f"%{canonicalize(artist)}%"))
+    return exists().where(and_(*conditions))
+
+
+async def create_extension(conn: AsyncConnection) -> None:
+    """トライグラムインデックス用のpg_trgm拡張を有効化(create_allより前に実行)"""
+    await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+async def migrate(conn: AsyncConnection) -> None:
+    """既存のsongsテーブルにcatalog_id列を追加(create_allの後に実行、冪等)"""
+    for statement in MIGRATION_SQL:
+        await conn.execute(text(statement))
+
+
+def catalog_row(song: dict) -> dict:
+    """楽曲の行からカタログエントリの値を生成"""
+    return {
+        "song_key": song_key(song),
+        "canonical_name": canonicalize(song["name"]),
+        "canonical_artist": canonicalize(song["artist"]),
+        "youtube_url": _url(song["youtube_url"]),
+        "spotify_url": _url(song["spotify_url"]),
+        "apple_music_url": _url(song["apple_music_url"]),
+    }
+
+
+async def backfill() -> int:
+    """カタログ未紐付けのsongsをカタログへ紐付け、処理件数を返す"""
+    from database import AsyncSessionLocal
+
+    total = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            stmt = select(
+                Song.id, Song.name, Song.artist, Song.youtube_url,
+                Song.spotify_url, Song.apple_music_url
+            ).where(Song.catalog_id.is_(None)).limit(BACKFILL_BATCH_SIZE)
+            rows = [row._asdict() for row in (await db.execute(stmt)).all()]
+            if not rows:
+                break
+            for row in rows:
+                result = await db.execute(UPSERT_CATALOG_SQL, {"id": uuid.uuid4(), **catalog_row(row)})
+                await db.execute(
+                    update(Song).where(Song.id == row["id"]).values(catalog_id=result.scalar_one())
+                )
+            await db.commit()
+            total += len(rows)
+            print(f"{total}件を紐付けました")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="楽曲カタログの管理")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("backfill", help="カタログ未紐付けの楽曲を紐付け")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        asyncio.run(backfill())
@@ -0,0 +1,47 @@
+"""コードn-gram抽出のテスト"""
+
+from analytics import extract_ngrams
+
+
+def test_extracts_two_to_four_grams():
+    assert extract_ngrams([["IV", "V", "IIIm", "VIm"]]) == {
+        (2, "IV|V"), (2, "V|IIIm"), (2, "IIIm|VIm"),
+        (3, "IV|V|IIIm"), (3, "V|IIIm|VIm"),
+        (4, "IV|V|IIIm|VIm"),
+    }
+
+
+def test_collapses_repeated_chords_and_skips_empty_slots():
+    chords = ["IV", "IV", "", None, "V", "V", "V", "", "I"]
+    assert extract_ngrams([chords]) == {(2, "IV|V"), (2, "V|I"), (3, "IV|V|I")}
+
+
+def test_repeat_across_an_empty_slot_is_collapsed():
+    assert extract_ngrams([["I", "", "I", "V"]]) == {(2, "I|V")}
+
+
+def test_normalizes_full_width_notation():
+    assert extract_ngrams([["Ⅳ", "♭Ⅶ"]]) == {(2, "IV|bVII")}
+    assert extract_ngrams([["Ⅳ", "IV", "V"]]) == {(2, "IV|V")}
+
+
+def test_dedups_within_one_progression():
+    ngrams = extract_ngrams([
+        ["IV", "V", "IV", "V"],
+        ["IV", "V"],
+    ])
+    assert ngrams == {
+        (2, "IV|V"), (2, "V|IV"),
+        (3, "IV|V|IV"), (3, "V|IV|V"),
+        (4, "IV|V|IV|V"),
+    }
+
+
+def test_does_not_join_chords_across_patterns():
+    assert extract_ngrams([["I"], ["V"]]) == set()
+    assert (2, "V|I") not in extract_ngrams([["IV", "V"], ["I", "VIm"]])
+
+
+def test_short_and_missing_patterns():
+    assert extract_ngrams([]) == set()
+    assert extract_ngrams([None, [], ["I"], ["I", "I", "I"]]) == set()
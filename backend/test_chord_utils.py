@@ -0,0 +1,58 @@
+"""キー名の解釈と音名表記への変換のテスト"""
+
+import pytest
+
+import chord_utils
+from chord_utils import KEYS, KEY_CHORD_TABLE, parse_key, render_chord, render_patterns
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("F", "F"),
+    ("f#", "F#"),
+    ("EB", "Eb"),
+    ("BB", "Bb"),
+    ("eb", "Eb"),
+    ("Gb", "F#"),
+    ("gB", "F#"),
+    ("B♭", "Bb"),
+    ("C#", "Db"),
+    (" a ", "A"),
+    ("H", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_key(name, expected):
+    assert parse_key(name) == expected
+
+
+@pytest.mark.parametrize("key, chords, expected", [
+    ("C", ["I", "IV", "V", "VIm"], ["C", "F", "G", "Am"]),
+    ("F", ["IV", "bVII", "V7"], ["Bb", "Eb", "C7"]),
+    ("Eb", ["I", "IIm7", "bVI", "#IVm7b5"], ["Eb", "Fm7", "Cb", "Am7b5"]),
+    ("F#", ["VII", "#IV", "III"], ["E#", "B#", "A#"]),
+    ("Db", ["bIII", "bII"], ["Fb", "Ebb"]),
+])
+def test_spelling_keeps_one_letter_per_degree(key, chords, expected):
+    assert [render_chord(chord, key) for chord in chords] == expected
+
+
+def test_every_key_spells_the_scale_with_seven_letters():
+    for key in KEYS:
+        scale = [KEY_CHORD_TABLE[key][degree] for degree in ("I", "II", "III", "IV", "V", "VI", "VII")]
+        assert sorted(note[0] for note in scale) == sorted("ABCDEFG")
+
+
+def test_uncommon_spellings_do_not_grow_the_table():
+    size = len(KEY_CHORD_TABLE["F"])
+    assert render_chord("Ⅳmaj7", "F") == "Bbmaj7"
+    assert render_chord("IV/VI", "F") == "Bb/D"
+    assert render_chord("X7", "F") == "X7"
+    assert len(KEY_CHORD_TABLE["F"]) == size
+    assert chord_utils._render_uncommon_chord.cache_info().maxsize == chord_utils.MAX_CACHED_RENDERED_CHORDS
+
+
+def test_render_patterns_keeps_empty_slots():
+    patterns = [{"chords": ["I", "", None, "V/VII"]}, {"chords": None}]
+    render_patterns(patterns, "G")
+    assert patterns[0]["rendered_chords"] == ["G", "", None, "D/F#"]
+    assert patterns[1]["rendered_chords"] == []
@@ -0,0 +1,148 @@
+"""編集リクエストの構造差分のテスト"""
+
+import uuid
+from types import SimpleNamespace
+
+from progression_diff import DiffCache, diff_patterns, diff_songs
+
+
+def pattern(label, sort_order, chords=("I", "IV", "V", "I")):
+    return SimpleNamespace(label=label, sort_order=sort_order, chords=list(chords))
+
+
+def song(name, artist=None, **urls):
+    fields = {"youtube_url": None, "spotify_url": None, "apple_music_url": None}
+    fields.update(urls)
+    return SimpleNamespace(name=name, artist=artist, **fields)
+
+
+def test_unchanged_patterns_are_omitted():
+    before = [pattern("Aメロ", 0), pattern("サビ", 1)]
+    after = [pattern("Aメロ", 0), pattern("サビ", 1)]
+    assert diff_patterns(before, after) == []
+
+
+def test_relabel_pairs_by_sort_order():
+    diffs = diff_patterns([pattern("Aメロ", 0)], [pattern("Verse", 0)])
+
+    assert diffs == [{
+        "status": "modified",
+        "label": "Verse",
+        "sort_order": 0,
+        "before_label": "Aメロ",
+        "before_sort_order": None,
+        "chords": None,
+        "slots": [],
+    }]
+
+
+def test_reorder_pairs_by_label():
+    before = [pattern("Aメロ", 0, ["I"]), pattern("サビ", 1, ["IV"])]
+    after = [pattern("サビ", 0, ["IV"]), pattern("Aメロ", 1, ["I"])]
+    diffs = diff_patterns(before, after)
+
+    assert [(d["label"], d["sort_order"], d["before_sort_order"], d["before_label"]) for d in diffs] == [
+        ("サビ", 0, 1, None),
+        ("Aメロ", 1, 0, None),
+    ]
+    assert all(d["status"] == "modified" and d["slots"] == [] for d in diffs)
+
+
+def test_duplicate_labels_pair_in_order():
+    before = [pattern("サビ", 0, ["I"]), pattern("サビ", 1, ["IV"])]
+    after = [pattern("サビ", 0, ["I"]), pattern("サビ", 1, ["V"])]
+    diffs = diff_patterns(before, after)
+
+    assert len(diffs) == 1
+    assert diffs[0]["sort_order"] == 1
+    assert diffs[0]["slots"] == [{"index": 0, "before": "IV", "after": "V"}]
+
+
+def test_added_and_removed_patterns():
+    before = [pattern("Aメロ", 0), pattern("Bメロ", 1, ["VIm"])]
+    after = [pattern("Aメロ", 0), pattern("サビ", 2, ["IV", "V"])]
+    diffs = diff_patterns(before, after)
+
+    assert [(d["status"], d["label"], d["sort_order"]) for d in diffs] == [
+        ("removed", "Bメロ", 1),
+        ("added", "サビ", 2),
+    ]
+    assert diffs[0]["chords"] == ["VIm"]
+    assert diffs[1]["chords"] == ["IV", "V"]
+
+
+def test_removed_sorts_before_added_at_the_same_position():
+    before = [pattern("Aメロ", 0), pattern("Bメロ", 1)]
+    after = [pattern("Aメロ", 0), pattern("サビ", 1), pattern("アウトロ", 2)]
+    diffs = diff_patterns(before, after)
+
+    # Bメロ→サビは並び順が同じためラベル変更として対応付け、アウトロは追加
+    assert [(d["status"], d["label"], d["before_label"]) for d in diffs] == [
+        ("modified", "サビ", "Bメロ"),
+        ("added", "アウトロ", None),
+    ]
+
+
+def test_slot_diff_treats_empty_and_missing_as_null():
+    before = [pattern("A", 0, ["I", "", None])]
+    after = [pattern("A", 0, ["I", None, "", "V"])]
+    diffs = diff_patterns(before, after)
+
+    assert diffs[0]["slots"] == [{"index": 3, "before": None, "after": "V"}]
+
+
+def test_slot_diff_covers_more_than_sixteen_slots():
+    chords = ["I"] * 18
+    changed = chords[:17] + ["V"]
+    diffs = diff_patterns([pattern("A", 0, chords)], [pattern("A", 0, changed)])
+
+    assert diffs[0]["slots"] == [{"index": 17, "before": "I", "after": "V"}]
+
+
+def test_slot_diff_of_null_chords():
+    diffs = diff_patterns([pattern("A", 0, [])], [pattern("A", 0, ["IV"])])
+    assert diffs[0]["slots"] == [{"index": 0, "before": None, "after": "IV"}]
+    diffs = diff_patterns([SimpleNamespace(label="A", sort_order=0, chords=None)], [pattern("A", 0, ["IV"])])
+    assert diffs[0]["slots"] == [{"index": 0, "before": None, "after": "IV"}]
+
+
+def test_songs_match_ignoring_case_and_whitespace():
+    before = [song("Lemon", "米津玄師"), song("Pretender", "Official髭男dism")]
+    after = [
+        song(" lemon ", "米津玄師", youtube_url="https://youtu.be/x"),
+        song("Marigold", "あいみょん"),
+    ]
+    diffs = diff_songs(before, after)
+
+    assert [(d["status"], d["name"]) for d in diffs] == [
+        ("modified", " lemon "),
+        ("removed", "Pretender"),
+        ("added", "Marigold"),
+    ]
+    assert {f["field"] for f in diffs[0]["fields"]} == {"name", "youtube_url"}
+
+
+def test_diff_cache_skips_results_computed_across_invalidation():
+    cache = DiffCache(max_entries=2)
+    progression_id = uuid.uuid4()
+
+    generation = cache.generation
+    cache.discard(uuid.uuid4())
+    cache.put(progression_id, "stale", generation)
+    assert cache.get(progression_id) is None
+
+    cache.put(progression_id, "fresh", cache.generation)
+    assert cache.get(progression_id) == "fresh"
+
+
+def test_diff_cache_evicts_least_recently_used():
+    cache = DiffCache(max_entries=2)
+    first, second, third = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    cache.put(first, 1, cache.generation)
+    cache.put(second, 2, cache.generation)
+    cache.get(first)
+    cache.put(third, 3, cache.generation)
+
+    assert cache.get(second) is None
+    assert cache.get(first) == 1
+    assert cache.get(third) == 3
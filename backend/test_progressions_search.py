@@ -0,0 +1,103 @@
+"""一覧API(検索条件+表示キー)の回帰テスト
+
+DBには接続せず、クエリ順に結果を返すスタブセッションでエンドポイント関数を直接呼ぶ。
+    python -m pytest -q
+"""
+
+import asyncio
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+
+import main
+import serializers
+from search_cache import search_cache
+
+
+class StubResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return list(self._rows)
+
+    def scalars(self):
+        return StubResult([row[0] if isinstance(row, tuple) else row for row in self._rows])
+
+
+class StubSession:
+    """execute()のたびに用意した結果を先頭から返す"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.statements = []
+
+    async def execute(self, stmt, params=None):
+        self.statements.append(stmt)
+        return StubResult(self.results.pop(0))
+
+
+PROGRESSION_ID = uuid.uuid4()
+CREATED_AT = datetime(2024, 1, 1)
+LIST_ROW = (PROGRESSION_ID, "王道進行", None, "approved", CREATED_AT)
+PATTERN_ROW = (PROGRESSION_ID, "Aメロ", ["IV", "V", "IIIm", "VIm"], uuid.uuid4(), 0)
+
+
+@pytest.fixture(autouse=True)
+def reset_search_cache(monkeypatch):
+    search_cache.invalidate()
+    monkeypatch.setattr(serializers, "FAST_JSON_ENABLED", False)
+    yield
+    search_cache.invalidate()
+
+
+def get_progressions(db, key=None, sort="new", **conditions):
+    params = {"query": None, "chord_query": None, "song": None, "artist": None}
+    params.update(conditions)
+    return asyncio.run(main.get_progressions(sort=sort, key=key, db=db, **params))
+
+
+def test_search_with_key_renders_patterns():
+    # IDの検索 → 一覧の行 → パターン
+    db = StubSession([(PROGRESSION_ID,)], [LIST_ROW], [PATTERN_ROW])
+    response = get_progressions(db, key=main.get_render_key("F"), query="王道")
+
+    items = json.loads(response.body)
+    assert [item["id"] for item in items] == [str(PROGRESSION_ID)]
+    assert items[0]["patterns"][0]["rendered_chords"] == ["Bb", "C", "Am", "Dm"]
+    assert search_cache.get(main.make_search_key("王道", None, None, None)) == [PROGRESSION_ID]
+
+
+def test_search_with_key_uses_cached_ids():
+    search_cache.put(main.make_search_key("王道", None, None, None), [PROGRESSION_ID], search_cache.generation)
+    db = StubSession([LIST_ROW], [PATTERN_ROW])
+    response = get_progressions(db, key=main.get_render_key("F"), query=" 王道 ")
+
+    items = json.loads(response.body)
+    assert items[0]["patterns"][0]["rendered_chords"] == ["Bb", "C", "Am", "Dm"]
+    assert len(db.statements) == 2
+
+
+def test_search_without_key_returns_models():
+    progression = object()
+    db = StubSession([(PROGRESSION_ID,)], [progression])
+    assert get_progressions(db, query="王道") == [progression]
+
+
+def test_search_without_hits():
+    assert get_progressions(StubSession([]), query="該当なし") == []
+
+    response = get_progressions(StubSession([]), key=main.get_render_key("F"), query="該当なし")
+    assert json.loads(response.body) == []
+
+
+def test_popular_sort_reads_viewed_and_unviewed_in_one_statement():
+    db = StubSession([LIST_ROW], [PATTERN_ROW])
+    response = get_progressions(db, key=main.get_render_key("F"), sort="popular")
+
+    assert [item["id"] for item in json.loads(response.body)] == [str(PROGRESSION_ID)]
+    # 一覧の行 → パターンの2文のみ(閲覧数あり・なしを別々の文で読まない)
+    assert len(db.statements) == 2
+    assert "UNION ALL" in str(db.statements[0])
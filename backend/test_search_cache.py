@@ -0,0 +1,93 @@
+"""検索結果キャッシュのテスト"""
+
+import uuid
+
+import pytest
+
+import search_cache as search_cache_module
+from search_cache import SearchCache, make_search_key
+
+
+def ids(count):
+    return [uuid.uuid4() for _ in range(count)]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(search_cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_key_normalizes_text_and_chord_queries():
+    assert make_search_key(" Lemon ", "Ⅳ Ⅴ", None, None) == make_search_key("lemon", "IV V", "", "")
+    assert make_search_key("a", None, None, None) != make_search_key(None, "a", None, None)
+
+
+def test_evicts_least_recently_used_entry():
+    cache = SearchCache(max_ids=100, max_entries=2, ttl=60)
+    cache.put("a", ids(1), cache.generation)
+    cache.put("b", ids(1), cache.generation)
+    cache.get("a")
+    cache.put("c", ids(1), cache.generation)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.evictions == 1
+
+
+def test_evicts_by_total_ids():
+    # 1エントリの重みはID数+1
+    cache = SearchCache(max_ids=10, max_entries=100, ttl=60)
+    cache.put("a", ids(4), cache.generation)
+    cache.put("b", ids(4), cache.generation)
+    assert cache.get("a") is not None
+
+    cache.put("c", ids(1), cache.generation)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["ids"] == 5
+
+
+def test_skips_results_larger_than_the_cache():
+    cache = SearchCache(max_ids=10, max_entries=100, ttl=60)
+    cache.put("small", ids(1), cache.generation)
+    cache.put("huge", ids(10), cache.generation)
+
+    assert cache.get("huge") is None
+    assert cache.get("small") is not None
+
+
+def test_replacing_a_key_keeps_the_size_consistent():
+    cache = SearchCache(max_ids=100, max_entries=10, ttl=60)
+    cache.put("a", ids(5), cache.generation)
+    cache.put("a", ids(2), cache.generation)
+
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["ids"] == 2
+
+
+def test_expires_after_ttl(clock):
+    cache = SearchCache(max_ids=100, max_entries=10, ttl=60)
+    cache.put("a", ids(1), cache.generation)
+
+    clock[0] += 60
+    assert cache.get("a") is not None
+    clock[0] += 1
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_skips_results_computed_across_invalidation():
+    cache = SearchCache(max_ids=100, max_entries=10, ttl=60)
+    cache.put("old", ids(1), cache.generation)
+    generation = cache.generation
+    cache.invalidate()
+    cache.put("a", ids(1), generation)
+
+    assert cache.get("old") is None
+    assert cache.get("a") is None
+    cache.put("a", ids(1), cache.generation)
+    assert cache.get("a") is not None
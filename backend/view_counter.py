@@ -0,0 +1,163 @@
+"""閲覧数のライトビハインド集計
+
+詳細APIのたびにUPDATEすると行ロックの競合やテーブル肥大化を招くため、
+閲覧数はワーカー内メモリで集計し、一定間隔でprogression_viewsテーブルへ
+まとめてUPSERTする。
+
+ワーカーが異常終了した場合に失われる閲覧数は、最大でも
+1回のフラッシュ間隔分(またはMAX_PENDING_VIEWS件)に限られる。
+DBに書き込めない間は間隔を空けて再試行し、未フラッシュの閲覧数が
+MAX_BUFFERED_VIEWS件を超えた分は破棄する(stats()のlost_viewsに計上)。
+"""
+
+import asyncio
+import logging
+import os
+from collections import Counter
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import text, bindparam, BigInteger
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# フラッシュ間隔(秒)
+FLUSH_INTERVAL_SECONDS = float(os.getenv("VIEW_FLUSH_INTERVAL_SECONDS", "10"))
+# 未フラッシュの閲覧数がこの件数に達したら間隔を待たずにフラッシュ
+MAX_PENDING_VIEWS = int(os.getenv("VIEW_MAX_PENDING", "10000"))
+# フラッシュに失敗し続けた場合に保持する未フラッシュ閲覧数の上限(超えた分は破棄)
+MAX_BUFFERED_VIEWS = int(os.getenv("VIEW_MAX_BUFFERED", "100000"))
+# フラッシュ失敗後の再試行間隔(秒、失敗のたびに倍増)
+RETRY_MIN_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+# 承認済みでない(削除済み・承認待ちの)進行は除外し、既存行には加算する
+UPSERT_SQL = text("""
+    INSERT INTO progression_views (progression_id, view_count, updated_at)
+    SELECT v.id, v.count, CURRENT_TIMESTAMP
+    FROM unnest(:ids, :counts) AS v(id, count)
+    WHERE EXISTS (SELECT 1 FROM progressions p WHERE p.id = v.id AND p.status = 'approved')
+    ON CONFLICT (progression_id) DO UPDATE
+    SET view_count = progression_views.view_count + EXCLUDED.view_count,
+        updated_at = EXCLUDED.updated_at
+""").bindparams(
+    bindparam("ids", type_=ARRAY(PG_UUID(as_uuid=True))),
+    bindparam("counts", type_=ARRAY(BigInteger)),
+)
+
+# 編集の承認時に、元の進行の閲覧数を編集後の進行へ合算する
+MERGE_SQL = text("""
+    INSERT INTO progression_views (progression_id, view_count, updated_at)
+    SELECT :target, view_count, updated_at
+    FROM progression_views WHERE progression_id = :source
+    ON CONFLICT (progression_id) DO UPDATE
+    SET view_count = progression_views.view_count + EXCLUDED.view_count,
+        updated_at = GREATEST(progression_views.updated_at, EXCLUDED.updated_at)
+""").bindparams(
+    bindparam("source", type_=PG_UUID(as_uuid=True)),
+    bindparam("target", type_=PG_UUID(as_uuid=True)),
+)
+
+
+class ViewCounter:
+    """閲覧数をメモリで集計し定期的にDBへ書き出す"""
+
+    def __init__(self):
+        self._pending: Counter = Counter()
+        self._pending_total = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self.flushed = 0
+        self.failed_flushes = 0
+        self.lost_views = 0
+
+    def record(self, progression_id: UUID) -> None:
+        """閲覧を1件記録(DBアクセスなし)
+
+        未フラッシュの閲覧数がMAX_BUFFERED_VIEWSに達している場合は破棄する。
+        """
+        if self._pending_total >= MAX_BUFFERED_VIEWS:
+            self.lost_views += 1
+            return
+        self._pending[progression_id] += 1
+        self._pending_total += 1
+        if self._pending_total >= MAX_PENDING_VIEWS:
+            self._wakeup.set()
+
+    async def flush(self) -> bool:
+        """未フラッシュの閲覧数を1文でUPSERT
+
+        複数ワーカーのフラッシュ同士でデッドロックしないよう、IDの順に書き込む。
+        失敗した場合は次回のフラッシュに持ち越す(上限を超える分は破棄)。
+
+        Returns:
+            bool: 失敗した場合False
+        """
+        if not self._pending:
+            return True
+        pending, self._pending = self._pending, Counter()
+        total, self._pending_total = self._pending_total, 0
+        items = sorted(pending.items())
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(UPSERT_SQL, {
+                    "ids": [progression_id for progression_id, _ in items],
+                    "counts": [count for _, count in items],
+                })
+                await session.commit()
+            self.flushed += total
+            return True
+        except (OSError, SQLAlchemyError) as e:
+            logger.warning("閲覧数のフラッシュに失敗しました: %s", e)
+            self.failed_flushes += 1
+            if self._pending_total + total > MAX_BUFFERED_VIEWS:
+                self.lost_views += total
+            else:
+                self._pending.update(pending)
+                self._pending_total += total
+            return False
+
+    async def _run(self) -> None:
+        delay = RETRY_MIN_DELAY
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if await self.flush():
+                delay = RETRY_MIN_DELAY
+                continue
+            # DB停止中に閲覧のたびに接続を試みないよう、間隔を空けて再試行する
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_DELAY)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """定期フラッシュを止め、残りを書き出す"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending_views": self._pending_total,
+            "pending_progressions": len(self._pending),
+            "flushed": self.flushed,
+            "failed_flushes": self.failed_flushes,
+            "lost_views": self.lost_views,
+        }
+
+
+view_counter = ViewCounter()
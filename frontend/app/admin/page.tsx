@@ -3,13 +3,15 @@
  * 
  * パスワード認証後に以下の機能を提供:
  * - 承認待ち投稿の管理（承認/却下）
- * - 編集リクエストの差分表示
+ *   一覧はサマリーをページ単位で取得し、新着はSSEで受信する
+ * - 編集リクエストの差分表示（サーバー側で計算した変更箇所のみ）
  * - IPアドレスブロック管理
+ * - IPアドレス別の投稿数（直近の多い順）と一括ブロック
  */
 
 "use client"
 
-import React, { useState, useEffect } from 'react'
+import React, { useState, useEffect, useRef, useCallback } from 'react'
 import { Button } from '@/components/ui/button'
 import { Input } from '@/components/ui/input'
 import { Card, CardContent, CardHeader, CardTitle, CardDescription } from '@/components/ui/card'
@@ -26,23 +28,38 @@ import {
 import { useToast } from '@/components/ui/use-toast'
 import { Check, X, Eye, Shield, Trash2, Plus } from 'lucide-react'
 import {
-  fetchPendingProgressions,
+  fetchPendingPage,
+  getPendingStreamUrl,
   fetchDiff,
   processPending,
   fetchBlockedIPs,
   blockIP,
+  blockIPsBulk,
   unblockIP,
+  fetchIpActivity,
   fetchFeedbacks,
-  type Progression,
+  type PendingSummary,
   type DiffResponse,
   type BlockedIP,
+  type IpActivityItem,
   type Feedback
 } from '@/lib/api'
 
+// IPアクティビティの集計期間（時間）
+const ACTIVITY_WINDOWS = [
+  { hours: 1, label: '1時間' },
+  { hours: 24, label: '24時間' },
+  { hours: 24 * 7, label: '7日間' },
+  { hours: 24 * 30, label: '30日間' },
+]
+
 export default function AdminPage() {
   const [adminPassword, setAdminPassword] = useState('')
   const [isAuthenticated, setIsAuthenticated] = useState(false)
-  const [pendingList, setPendingList] = useState<Progression[]>([])
+  const [pendingList, setPendingList] = useState<PendingSummary[]>([])
+  const [pendingTotal, setPendingTotal] = useState(0)
+  const [pendingEditCount, setPendingEditCount] = useState(0)
+  const [isLoadingMore, setIsLoadingMore] = useState(false)
   const [blockedIPs, setBlockedIPs] = useState<BlockedIP[]>([])
   const [feedbacks, setFeedbacks] = useState<Feedback[]>([])
   const [isLoading, setIsLoading] = useState(false)
@@ -50,13 +67,24 @@ export default function AdminPage() {
   const [showDiffDialog, setShowDiffDialog] = useState(false)
   const [newBlockIP, setNewBlockIP] = useState('')
   const [newBlockReason, setNewBlockReason] = useState('')
+  const [ipActivity, setIpActivity] = useState<IpActivityItem[]>([])
+  const [activityHours, setActivityHours] = useState(24)
+  const [selectedIPs, setSelectedIPs] = useState<Set<string>>(new Set())
+  const [bulkBlockReason, setBulkBlockReason] = useState('')
+  const [rejectPending, setRejectPending] = useState(true)
   const { toast } = useToast()
+  // 処理済みID（自分の操作とSSEの二重反映を防ぐ）
+  const processedIds = useRef<Set<string>>(new Set())
+  // 承認待ちを末尾まで読み込み済みか（新着を一覧へ追加してよいか）
+  const isFullyLoaded = useRef(false)
+
+  const PENDING_PAGE_SIZE = 50
 
   const handleLogin = async (e: React.FormEvent) => {
     e.preventDefault()
     try {
       setIsLoading(true)
-      await fetchPendingProgressions(adminPassword)
+      await fetchPendingPage(adminPassword, 0, 1)
       setIsAuthenticated(true)
       loadData()
     } catch (error: any) {
@@ -73,14 +101,15 @@ export default function AdminPage() {
   const loadData = async () => {
     try {
       setIsLoading(true)
-      const [pending, blocked, feedbackList] = await Promise.all([
-        fetchPendingProgressions(adminPassword),
+      const [, blocked, feedbackList, activity] = await Promise.all([
+        loadPending(),
         fetchBlockedIPs(adminPassword),
-        fetchFeedbacks(adminPassword)
+        fetchFeedbacks(adminPassword),
+        fetchIpActivity(adminPassword, activityHours)
       ])
-      setPendingList(pending)
       setBlockedIPs(blocked)
       setFeedbacks(feedbackList)
+      setIpActivity(activity.items)
     } catch (error) {
       toast({
         title: 'エラー',
@@ -92,6 +121,78 @@ export default function AdminPage() {
     }
   }
 
+  // 承認待ち一覧の先頭ページを取得（一覧をリセット）
+  const loadPending = useCallback(async () => {
+    const page = await fetchPendingPage(adminPassword, 0, PENDING_PAGE_SIZE)
+    processedIds.current.clear()
+    isFullyLoaded.current = page.items.length >= page.total
+    setPendingList(page.items)
+    setPendingTotal(page.total)
+    setPendingEditCount(page.edit_count)
+  }, [adminPassword])
+
+  const handleLoadMore = async () => {
+    try {
+      setIsLoadingMore(true)
+      const page = await fetchPendingPage(adminPassword, pendingList.length, PENDING_PAGE_SIZE)
+      isFullyLoaded.current = pendingList.length + page.items.length >= page.total
+      setPendingList((prev) => {
+        const known = new Set(prev.map((item) => item.id))
+        return [...prev, ...page.items.filter((item) => !known.has(item.id))]
+      })
+      setPendingTotal(page.total)
+      setPendingEditCount(page.edit_count)
+    } catch (error) {
+      toast({
+        title: 'エラー',
+        description: 'データの読み込みに失敗しました',
+        variant: 'destructive'
+      })
+    } finally {
+      setIsLoadingMore(false)
+    }
+  }
+
+  // 承認/却下された投稿を一覧から除外（同じIDは一度だけ反映）
+  const removePending = useCallback((id: string, isEdit: boolean) => {
+    if (processedIds.current.has(id)) return
+    processedIds.current.add(id)
+    setPendingList((prev) => prev.filter((item) => item.id !== id))
+    setPendingTotal((prev) => Math.max(prev - 1, 0))
+    if (isEdit) setPendingEditCount((prev) => Math.max(prev - 1, 0))
+  }, [])
+
+  // SSEで承認待ちキューの変化を受信
+  useEffect(() => {
+    if (!isAuthenticated) return
+
+    const source = new EventSource(getPendingStreamUrl(adminPassword))
+    let hasOpened = false
+
+    source.onopen = () => {
+      // 再接続時は取りこぼし分を含めて先頭ページを取り直す
+      if (hasOpened) loadPending().catch(() => {})
+      hasOpened = true
+    }
+
+    source.addEventListener('pending', (event) => {
+      const item: PendingSummary = JSON.parse((event as MessageEvent).data)
+      setPendingTotal((prev) => prev + 1)
+      if (item.original_id) setPendingEditCount((prev) => prev + 1)
+      // 古い順に並ぶため、末尾まで読み込み済みの場合のみ追加
+      if (isFullyLoaded.current) {
+        setPendingList((prev) => prev.some((p) => p.id === item.id) ? prev : [...prev, item])
+      }
+    })
+
+    source.addEventListener('processed', (event) => {
+      const { id, is_edit } = JSON.parse((event as MessageEvent).data)
+      removePending(id, is_edit)
+    })
+
+    return () => source.close()
+  }, [isAuthenticated, adminPassword, loadPending, removePending])
+
   const handleViewDiff = async (id: string) => {
     try {
       const diff = await fetchDiff(id, adminPassword)
@@ -106,14 +207,14 @@ export default function AdminPage() {
     }
   }
 
-  const handleProcess = async (id: string, action: 'approve' | 'reject') => {
+  const handleProcess = async (id: string, action: 'approve' | 'reject', isEdit: boolean) => {
     try {
       await processPending(id, action, adminPassword)
       toast({
         title: '完了',
         description: action === 'approve' ? '承認しました' : '却下しました'
       })
-      loadData()
+      removePending(id, isEdit)
       setShowDiffDialog(false)
     } catch (error) {
       toast({
@@ -136,7 +237,7 @@ export default function AdminPage() {
       })
       setNewBlockIP('')
       setNewBlockReason('')
-      loadData()
+      setBlockedIPs(await fetchBlockedIPs(adminPassword))
     } catch (error) {
       toast({
         title: 'エラー',
@@ -153,7 +254,7 @@ export default function AdminPage() {
         title: '完了',
         description: 'ブロックを解除しました'
       })
-      loadData()
+      setBlockedIPs(await fetchBlockedIPs(adminPassword))
     } catch (error) {
       toast({
         title: 'エラー',
@@ -163,6 +264,62 @@ export default function AdminPage() {
     }
   }
 
+  const loadIpActivity = async (hours: number) => {
+    try {
+      setActivityHours(hours)
+      const activity = await fetchIpActivity(adminPassword, hours)
+      setIpActivity(activity.items)
+      setSelectedIPs(new Set())
+    } catch (error) {
+      toast({
+        title: 'エラー',
+        description: 'IPアクティビティの読み込みに失敗しました',
+        variant: 'destructive'
+      })
+    }
+  }
+
+  const toggleSelectedIP = (ip: string) => {
+    setSelectedIPs((prev) => {
+      const next = new Set(prev)
+      if (next.has(ip)) {
+        next.delete(ip)
+      } else {
+        next.add(ip)
+      }
+      return next
+    })
+  }
+
+  const handleBulkBlock = async () => {
+    if (selectedIPs.size === 0) return
+    try {
+      const result = await blockIPsBulk(
+        Array.from(selectedIPs),
+        bulkBlockReason,
+        rejectPending,
+        adminPassword
+      )
+      toast({
+        title: '完了',
+        description: `${result.blocked.length}件のIPアドレスをブロックしました` +
+          (result.rejected_count > 0 ? `（承認待ち${result.rejected_count}件を却下）` : '')
+      })
+      setBulkBlockReason('')
+      setBlockedIPs(await fetchBlockedIPs(adminPassword))
+      await loadIpActivity(activityHours)
+      if (result.rejected_count > 0) {
+        await loadPending()
+      }
+    } catch (error) {
+      toast({
+        title: 'エラー',
+        description: '一括ブロックに失敗しました',
+        variant: 'destructive'
+      })
+    }
+  }
+
   if (!isAuthenticated) {
     return (
       <div className="max-w-md mx-auto mt-20">
@@ -209,9 +366,12 @@ export default function AdminPage() {
       </div>
 
       <Tabs defaultValue="pending">
-        <TabsList className="grid w-full grid-cols-3">
+        <TabsList className="grid w-full grid-cols-4">
           <TabsTrigger value="pending">
-            承認待ち ({pendingList.length})
+            承認待ち ({pendingTotal})
+          </TabsTrigger>
+          <TabsTrigger value="activity">
+            IPアクティビティ
           </TabsTrigger>
           <TabsTrigger value="blocked">
             ブロックIP ({blockedIPs.length})
@@ -222,6 +382,11 @@ export default function AdminPage() {
         </TabsList>
 
         <TabsContent value="pending" className="space-y-4">
+          {pendingTotal > 0 && (
+            <div className="text-sm text-muted-foreground">
+              全{pendingTotal}件（うち編集リクエスト{pendingEditCount}件）
+            </div>
+          )}
           {isLoading ? (
             <div className="text-center py-8 text-muted-foreground">
               読み込み中...
@@ -257,14 +422,14 @@ export default function AdminPage() {
                       <Button
                         variant="default"
                         size="sm"
-                        onClick={() => handleProcess(item.id, 'approve')}
+                        onClick={() => handleProcess(item.id, 'approve', !!item.original_id)}
                       >
                         <Check className="h-4 w-4 mr-1" /> 承認
                       </Button>
                       <Button
                         variant="destructive"
                         size="sm"
-                        onClick={() => handleProcess(item.id, 'reject')}
+                        onClick={() => handleProcess(item.id, 'reject', !!item.original_id)}
                       >
                         <X className="h-4 w-4 mr-1" /> 却下
                       </Button>
@@ -272,23 +437,101 @@ export default function AdminPage() {
                   </div>
                 </CardHeader>
                 <CardContent>
-                  {item.remarks && (
-                    <p className="text-sm text-muted-foreground mb-2">{item.remarks}</p>
-                  )}
-                  <div className="space-y-2">
-                    {item.patterns.map((pattern, idx) => (
-                      <div key={idx} className="text-sm">
-                        <span className="font-medium">{pattern.label}: </span>
-                        <span className="text-muted-foreground">
-                          {pattern.chords.filter(Boolean).join(' - ')}
-                        </span>
-                      </div>
-                    ))}
+                  <div className="text-sm text-muted-foreground">
+                    パターン{item.pattern_count}件 / 楽曲{item.song_count}件
                   </div>
+                  {item.chords_preview && (
+                    <div className="text-sm mt-1 truncate">
+                      {item.chords_preview.split('||').join(' / ').split('|').join(' - ')}
+                    </div>
+                  )}
                 </CardContent>
               </Card>
             ))
           )}
+          {!isLoading && pendingList.length < pendingTotal && (
+            <div className="text-center">
+              <Button variant="outline" onClick={handleLoadMore} disabled={isLoadingMore}>
+                {isLoadingMore ? '読み込み中...' : 'さらに読み込む'}
+              </Button>
+            </div>
+          )}
+        </TabsContent>
+
+        <TabsContent value="activity" className="space-y-4">
+          <div className="flex flex-wrap gap-2">
+            {ACTIVITY_WINDOWS.map((option) => (
+              <Button
+                key={option.hours}
+                variant={activityHours === option.hours ? 'default' : 'outline'}
+                size="sm"
+                onClick={() => loadIpActivity(option.hours)}
+              >
+                {option.label}
+              </Button>
+            ))}
+          </div>
+
+          {selectedIPs.size > 0 && (
+            <Card>
+              <CardContent className="flex flex-wrap items-end gap-4 py-4">
+                <div className="flex-1 min-w-[200px]">
+                  <Label>理由</Label>
+                  <Input
+                    value={bulkBlockReason}
+                    onChange={(e) => setBulkBlockReason(e.target.value)}
+                    placeholder="スパム投稿"
+                  />
+                </div>
+                <label className="flex items-center gap-2 text-sm">
+                  <input
+                    type="checkbox"
+                    checked={rejectPending}
+                    onChange={(e) => setRejectPending(e.target.checked)}
+                  />
+                  承認待ちの投稿も却下
+                </label>
+                <Button variant="destructive" onClick={handleBulkBlock}>
+                  <Shield className="h-4 w-4 mr-1" /> 選択した{selectedIPs.size}件をブロック
+                </Button>
+              </CardContent>
+            </Card>
+          )}
+
+          {ipActivity.length === 0 ? (
+            <div className="text-center py-8 text-muted-foreground">
+              この期間の投稿はありません
+            </div>
+          ) : (
+            <div className="space-y-2">
+              {ipActivity.map((item) => (
+                <Card key={item.ip_address}>
+                  <CardContent className="flex items-center gap-4 py-4">
+                    <input
+                      type="checkbox"
+                      checked={selectedIPs.has(item.ip_address)}
+                      disabled={item.blocked}
+                      onChange={() => toggleSelectedIP(item.ip_address)}
+                    />
+                    <div className="flex-1">
+                      <span className="font-mono">{item.ip_address}</span>
+                      {item.blocked && (
+                        <span className="ml-2 text-xs text-destructive">ブロック中</span>
+                      )}
+                      <div className="text-xs text-muted-foreground">
+                        新規{item.posts}件 / 編集{item.edits}件 / ご意見{item.feedbacks}件
+                        {' / '}却下{item.rejections}件 / 承認待ち{item.pending}件
+                        {item.last_at && (
+                          <> - 最終 {new Date(item.last_at).toLocaleString('ja-JP')}</>
+                        )}
+                      </div>
+                    </div>
+                    <div className="text-lg font-bold">{item.total}</div>
+                  </CardContent>
+                </Card>
+              ))}
+            </div>
+          )}
         </TabsContent>
 
         <TabsContent value="blocked" className="space-y-4">
@@ -386,48 +629,87 @@ export default function AdminPage() {
         <DialogContent className="max-w-4xl max-h-[90vh] overflow-y-auto">
           <DialogHeader>
             <DialogTitle>
-              {selectedDiff?.original ? '編集リクエストの差分' : '新規投稿の詳細'}
+              {selectedDiff?.original_id ? '編集リクエストの差分' : '新規投稿の詳細'}
             </DialogTitle>
           </DialogHeader>
           
           {selectedDiff && (
             <div className="space-y-4">
-              {selectedDiff.original && (
-                <div className="grid grid-cols-2 gap-4">
-                  <div>
-                    <h3 className="font-medium mb-2 text-red-600">変更前</h3>
-                    <Card className="border-red-200">
-                      <CardContent className="pt-4">
-                        <p className="font-medium">{selectedDiff.original.title}</p>
-                        <p className="text-sm text-muted-foreground">{selectedDiff.original.remarks}</p>
-                        {selectedDiff.original.patterns.map((p, i) => (
-                          <div key={i} className="text-sm mt-2">
-                            <span className="font-medium">{p.label}: </span>
-                            {p.chords.filter(Boolean).join(' - ')}
+              {!selectedDiff.updated && (
+                <div className="space-y-4">
+                  {selectedDiff.fields.length === 0 &&
+                    selectedDiff.patterns.length === 0 &&
+                    selectedDiff.songs.length === 0 && (
+                    <p className="text-muted-foreground">変更はありません</p>
+                  )}
+
+                  {selectedDiff.fields.map((f) => (
+                    <div key={f.field} className="text-sm">
+                      <span className="font-medium">{f.field === 'title' ? 'タイトル' : '備考'}: </span>
+                      <span className="text-red-600 line-through">{f.before || '(なし)'}</span>
+                      {' → '}
+                      <span className="text-green-600">{f.after || '(なし)'}</span>
+                    </div>
+                  ))}
+
+                  {selectedDiff.patterns.map((p, i) => (
+                    <Card
+                      key={i}
+                      className={p.status === 'added' ? 'border-green-200' : p.status === 'removed' ? 'border-red-200' : ''}
+                    >
+                      <CardContent className="pt-4 text-sm">
+                        <div className="font-medium mb-2">
+                          {p.status === 'added' ? '追加' : p.status === 'removed' ? '削除' : '変更'}
+                          {': '}
+                          {p.before_label ? `${p.before_label} → ${p.label}` : p.label}
+                          {p.before_sort_order !== null && p.before_sort_order !== undefined && (
+                            <span className="text-muted-foreground ml-2">
+                              （順番 {p.before_sort_order + 1} → {p.sort_order + 1}）
+                            </span>
+                          )}
+                        </div>
+                        {p.chords && (
+                          <div className="grid grid-cols-8 gap-1">
+                            {p.chords.map((c, ci) => (
+                              <div key={ci} className={`p-2 text-center border rounded ${c ? 'bg-muted' : ''}`}>
+                                {c || '-'}
+                              </div>
+                            ))}
                           </div>
-                        ))}
-                      </CardContent>
-                    </Card>
-                  </div>
-                  <div>
-                    <h3 className="font-medium mb-2 text-green-600">変更後</h3>
-                    <Card className="border-green-200">
-                      <CardContent className="pt-4">
-                        <p className="font-medium">{selectedDiff.updated.title}</p>
-                        <p className="text-sm text-muted-foreground">{selectedDiff.updated.remarks}</p>
-                        {selectedDiff.updated.patterns.map((p, i) => (
-                          <div key={i} className="text-sm mt-2">
-                            <span className="font-medium">{p.label}: </span>
-                            {p.chords.filter(Boolean).join(' - ')}
+                        )}
+                        {p.slots.map((slot) => (
+                          <div key={slot.index}>
+                            <span className="text-muted-foreground">{slot.index + 1}枠目: </span>
+                            <span className="text-red-600 line-through">{slot.before || '-'}</span>
+                            {' → '}
+                            <span className="text-green-600">{slot.after || '-'}</span>
                           </div>
                         ))}
                       </CardContent>
                     </Card>
-                  </div>
+                  ))}
+
+                  {selectedDiff.songs.length > 0 && (
+                    <div>
+                      <h4 className="font-medium">使用楽曲</h4>
+                      {selectedDiff.songs.map((s, i) => (
+                        <div key={i} className="text-sm">
+                          <span className={s.status === 'added' ? 'text-green-600' : s.status === 'removed' ? 'text-red-600 line-through' : ''}>
+                            {s.status === 'added' ? '追加' : s.status === 'removed' ? '削除' : '変更'}: {s.name} {s.artist && `- ${s.artist}`}
+                          </span>
+                          {s.fields.map((f) => (
+                            <div key={f.field} className="ml-4 text-muted-foreground">
+                              {f.field}: {f.before || '(なし)'} → {f.after || '(なし)'}
+                            </div>
+                          ))}
+                        </div>
+                      ))}
+                    </div>
+                  )}
                 </div>
               )}
 
-              {!selectedDiff.original && (
+              {selectedDiff.updated && (
                 <Card>
                   <CardContent className="pt-4">
                     <p className="font-medium text-lg">{selectedDiff.updated.title}</p>
@@ -473,12 +755,12 @@ export default function AdminPage() {
               <>
                 <Button
                   variant="destructive"
-                  onClick={() => handleProcess(selectedDiff.updated.id, 'reject')}
+                  onClick={() => handleProcess(selectedDiff.id, 'reject', !!selectedDiff.original_id)}
                 >
                   <X className="h-4 w-4 mr-1" /> 却下
                 </Button>
                 <Button
-                  onClick={() => handleProcess(selectedDiff.updated.id, 'approve')}
+                  onClick={() => handleProcess(selectedDiff.id, 'approve', !!selectedDiff.original_id)}
                 >
                   <Check className="h-4 w-4 mr-1" /> 承認
                 </Button>